@@ -0,0 +1,261 @@
+# vidminal benchmarks. offline: synthetic frames + a clip made with ffmpeg's lavfi,
+# no network, no real terminal. spits out JSON so runs can be diffed across commits.
+#
+#   python benchmarks/run.py                    # everything, JSON to stdout
+#   python benchmarks/run.py -o before.json     # save it
+#   python benchmarks/run.py --quick --only render,bytes
+#   python benchmarks/run.py --compare before.json after.json
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')  # no sound card needed
+os.environ.setdefault('COLUMNS', '320')  # playback_grid caps width at the "terminal"
+os.environ.setdefault('LINES', '100')
+
+import numpy as np
+import vidminal as v
+
+WIDTHS = (80, 160, 320)
+CLIP_SECONDS = 10
+CLIP_FPS = 24
+
+def ffmpeg_bin():
+    return os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+
+# moving test pattern + a tone, so there is real motion to delta and real audio to seek
+def make_clip(path, seconds=CLIP_SECONDS, fps=CLIP_FPS):
+    subprocess.run([ffmpeg_bin(), '-v', 'error', '-y',
+                    '-f', 'lavfi', '-i', f'testsrc2=size=640x360:rate={fps}',
+                    '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+                    '-t', str(seconds), '-c:v', 'mpeg4', '-q:v', '5', '-c:a', 'aac',
+                    '-pix_fmt', 'yuv420p', path], check=True)
+    return path
+
+def percentiles(samples):
+    a = np.asarray(samples, dtype=np.float64) * 1000
+    if not len(a):
+        return {}
+    return {'p50_ms': float(np.percentile(a, 50)), 'p90_ms': float(np.percentile(a, 90)),
+            'max_ms': float(a.max()), 'n': int(len(a))}
+
+# pic_to_ascii_from_pil frames/sec for every charset x width
+def bench_render(seconds):
+    frames = v.synthetic_frames()
+    out = {}
+    for name, chars in v.CHAR_SETS.items():
+        settings = v.render_settings(chars, 1.2, 1.5)
+        for wide in WIDTHS:
+            high = int(wide * 9 / 16 * 0.55) + 1
+            n = size = 0
+            t0 = time.perf_counter()
+            while time.perf_counter() - t0 < seconds or n < 3:
+                text, _ = v.pic_to_ascii_from_pil(frames[n % len(frames)], wide, high, settings)
+                size += len(text.encode('utf-8'))
+                n += 1
+            elapsed = time.perf_counter() - t0
+            out[f'{name}/{wide}'] = {'fps': n / elapsed, 'ms_per_frame': elapsed / n * 1000,
+                                     'bytes_per_frame': size / n}
+    return out
+
+# what actually goes to the terminal: full redraw vs delta, per color depth, on real motion
+def bench_bytes(clip, frames=120):
+    settings = v.render_settings(v.CHAR_SETS['default'], 1.2, 1.5)
+    info = v.probe_video(clip)
+    wide, tall = v.fit_grid(info['width'], info['height'], 160)
+    cells = []
+    with v.FFmpegDecoder(clip, (wide, tall), CLIP_FPS) as decoder:
+        for _ in range(frames):
+            rgb = np.empty((tall, wide, 3), np.uint8)
+            if not decoder.read_into(rgb):
+                break
+            cells.append(v.grid_frame_to_cells(rgb, settings))
+    out = {}
+    for depth in v.COLOR_DEPTHS:
+        full = sum(len(v.cells_to_bytes(g, c, settings.chars, depth)) for g, c in cells)
+        delta = v.DeltaRenderer(0.5, depth)
+        for g, c in cells:
+            delta.render_bytes(g, c, settings.chars)
+        out[depth] = {'full_bytes_per_frame': full / len(cells),
+                      'delta_bytes_per_frame': delta.total_bytes / delta.frames,
+                      'delta_full_redraws': delta.full_frames, 'frames': len(cells), 'grid': [wide, tall]}
+    return out
+
+def open_stream(clip, tmp, workers):
+    opts = v.OptionsWatcher(os.path.join(tmp, 'options.json'))
+    return v.get_stuff_from_video_stream(clip, os.path.join(tmp, 'temp'), speed=CLIP_FPS,
+                                         buffer_size=CLIP_FPS, wide=160, cache=None, settings=opts.render,
+                                         render_workers=workers, options=opts)
+
+# get_stuff_from_video_stream drained as fast as it will go (no playback pacing)
+def bench_decode(clip, tmp):
+    out = {}
+    for workers in (0, min(4, (os.cpu_count() or 1) - 1)):
+        if workers < 1 and out:
+            continue  # single core, nothing new to measure
+        t0 = time.perf_counter()
+        _, _, source, total, _ = open_stream(clip, tmp, workers)
+        first = None
+        n = 0
+        while True:
+            got = source.get(timeout=10)
+            if got is None:
+                break
+            first = first or time.perf_counter() - t0
+            n += 1
+        elapsed = time.perf_counter() - t0
+        source.close()
+        key = 'decode_only' if workers == 0 else f'decode_render_{workers}_workers'
+        out[key] = {'fps': n / elapsed, 'frames': n, 'expected_frames': total,
+                    'first_frame_ms': (first or 0) * 1000, 'realtime_x': n / elapsed / CLIP_FPS}
+    return out
+
+# ring reset -> first frame at the target, and AudioStream seek -> first chunk playing
+def bench_seek(clip, tmp, seeks=12):
+    rng = np.random.default_rng(1)
+    targets = rng.integers(0, int(v.probe_video(clip)['duration'] - 1) * CLIP_FPS, seeks)
+    _, _, source, _, _ = open_stream(clip, tmp, 0)
+    source.wait_filled(CLIP_FPS, timeout=10)
+    video = []
+    for target in targets:
+        t0 = time.perf_counter()
+        source.reset(int(target))
+        got = source.get(timeout=10)
+        video.append(time.perf_counter() - t0)
+        assert got and got[0] == target, (got and got[0], target)
+    source.close()
+    import pygame
+    pygame.mixer.init()
+    sound = v.AudioStream(clip)
+    audio = []
+    for target in targets:
+        t0 = time.perf_counter()
+        sound.seek(target / CLIP_FPS)
+        if sound.wait_started(2.0):
+            audio.append(time.perf_counter() - t0)
+    sound.close()
+    pygame.mixer.quit()
+    return {'video': percentiles(video), 'audio': percentiles(audio)}
+
+# main() in a real process on a pty: launch -> first status bar on screen, then 'q'
+def bench_first_frame(clip, tmp, runs=3):
+    import pty
+    import select
+    opts = dict(v.load_options(os.path.join(tmp, 'options.json')), show_ui_on_start=False,
+                cache_enabled=False, render_workers=0)
+    with open(os.path.join(tmp, 'options.json'), 'w', encoding='utf-8') as f:
+        json.dump(opts, f)
+    env = dict(os.environ, COLUMNS='160', LINES='50', TERM='xterm-256color', COLORTERM='truecolor')
+    times = []
+    for _ in range(runs):
+        master, slave = pty.openpty()
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'vidminal.py'), clip], cwd=tmp, env=env,
+                                stdin=slave, stdout=slave, stderr=slave, close_fds=True)
+        os.close(slave)
+        seen = b''
+        got = None
+        while got is None and time.perf_counter() - t0 < 30:
+            if select.select([master], [], [], 0.5)[0]:
+                try:
+                    seen += os.read(master, 65536)
+                except OSError:
+                    break
+                if b' / 00:00:' in seen:  # status bar goes out right after the first frame
+                    got = time.perf_counter() - t0
+        os.write(master, b'q')
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        os.close(master)
+        if got is not None:
+            times.append(got)
+    return percentiles(times)
+
+BENCHES = ('render', 'bytes', 'decode', 'seek', 'first_frame')
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(only, quick):
+    result = {'meta': {'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(), 'numpy': np.__version__,
+                       'platform': platform.platform(), 'cpus': os.cpu_count(), 'quick': quick}}
+    with tempfile.TemporaryDirectory(prefix='vidminal-bench-') as tmp:
+        clip = None
+        if only & {'bytes', 'decode', 'seek', 'first_frame'}:
+            clip = make_clip(os.path.join(tmp, 'clip.mp4'), 4 if quick else CLIP_SECONDS)
+        for name in BENCHES:
+            if name not in only:
+                continue
+            print(f'[bench] {name}...', file=sys.stderr)
+            if name == 'render':
+                result[name] = bench_render(0.3 if quick else 1.5)
+            elif name == 'bytes':
+                result[name] = bench_bytes(clip, 30 if quick else 120)
+            elif name == 'decode':
+                result[name] = bench_decode(clip, tmp)
+            elif name == 'seek':
+                result[name] = bench_seek(clip, tmp, 4 if quick else 12)
+            elif name == 'first_frame':
+                if os.name == 'nt':
+                    result[name] = {'skipped': 'needs a pty'}
+                else:
+                    result[name] = bench_first_frame(clip, tmp, 1 if quick else 3)
+    return result
+
+# every number in both files, side by side. higher fps = better, higher ms/bytes = worse
+def compare(old_path, new_path):
+    def flat(d, prefix=''):
+        for k, val in d.items():
+            if isinstance(val, dict):
+                yield from flat(val, f'{prefix}{k}.')
+            elif isinstance(val, (int, float)) and not isinstance(val, bool):
+                yield f'{prefix}{k}', val
+    with open(old_path, encoding='utf-8') as f:
+        old = dict(flat({k: val for k, val in json.load(f).items() if k != 'meta'}))
+    with open(new_path, encoding='utf-8') as f:
+        new = dict(flat({k: val for k, val in json.load(f).items() if k != 'meta'}))
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key], new[key]
+        change = (b - a) / a * 100 if a else 0.0
+        print(f'{key:<55} {a:>12.1f} {b:>12.1f} {change:>+8.1f}%')
+
+def main():
+    parser = argparse.ArgumentParser(description='vidminal benchmarks (offline, JSON out)')
+    parser.add_argument('-o', '--out', help='write JSON here instead of stdout')
+    parser.add_argument('--only', default=','.join(BENCHES), help=f'comma list out of: {",".join(BENCHES)}')
+    parser.add_argument('--quick', action='store_true', help='shorter clip, fewer iterations')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='diff two result files and exit')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    only = set(args.only.split(','))
+    unknown = only - set(BENCHES)
+    if unknown:
+        parser.error(f'unknown benchmark(s): {", ".join(sorted(unknown))}')
+    result = run(only, args.quick)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,7 @@
-# imports: chaos and magic
+# imports: chaos and magic. the heavy ones (PIL, pygame, moviepy, py7zr, multiprocessing)
+# get imported inside the functions that need them, so startup doesn't pay for them
+import time  # tick tock
+STARTUP_T0 = time.perf_counter()
 import os  # file goblin
 import sys  # sys go brr
 import warnings  # shhh
@@ -25,18 +28,19 @@ class SuppressStderr:
         sys.stderr = self._stderr
 
 with SuppressStderr():  # silence is golden
-        import time  # tick tock
-        from PIL import Image  # pixel wizard
         import threading  # spaghetti parallel
         import platform  # what planet am I on
-        import pygame  # sound go beep
-        from moviepy import VideoFileClip  # video wrangler
-        import py7zr  # zip zap
         import queue  # line up!
         import colorama  # color go brr
-        import multiprocessing  # more chaos
         import json  # config soup
         import tempfile  # temp trash
+        import functools  # memo magic
+        import collections  # named boxes
+        import hashlib  # fingerprints
+        import mmap  # frames straight off the disk
+        import struct  # byte layouts
+        import numpy as np  # whole frames at once (every video path needs it, so not lazy)
+STARTUP_IMPORTS = time.perf_counter() - STARTUP_T0
 
 # nuke temp folder
 def cleanup_temp_folder(temp_path):
@@ -54,9 +58,59 @@ def find_resource_path(rel):
         base = os.path.abspath('.')
     return os.path.join(base, rel)
 
-# ffmpeg: now you see me
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# bundled ffmpeg, unpacked once per archive into the user cache. the sha256 taken at
+# unpack time is re-checked whenever the file's size/mtime don't match the last check.
+# returns (path, what happened)
+def cached_ffmpeg(zip_path, ffmpeg_in_zip, suffix, cache_root=None):
+    size = os.path.getsize(zip_path)
+    name = os.path.splitext(os.path.basename(zip_path))[0]
+    folder = os.path.join(cache_root or default_cache_dir(), 'ffmpeg', f'{name}-{size}')
+    exe = os.path.join(folder, 'ffmpeg' + suffix)
+    manifest_path = os.path.join(folder, 'manifest.json')
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        st = os.stat(exe)
+        if [st.st_size, st.st_mtime_ns] == manifest['stat']:
+            return exe, 'cached'
+        if st.st_size == manifest['size'] and file_sha256(exe) == manifest['sha256']:
+            manifest['stat'] = [st.st_size, st.st_mtime_ns]  # touched but fine, don't hash it again
+            _write_json_atomic(manifest_path, manifest)
+            return exe, 'cached, checksum re-verified'
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # first run, half-written or damaged: unpack again
+    with SuppressStderr():
+        import py7zr  # zip zap
+    os.makedirs(folder, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=folder) as extract_dir:  # same disk, so the rename is atomic
+        with py7zr.SevenZipFile(zip_path, 'r') as archive:
+            archive.extract(targets=[ffmpeg_in_zip], path=extract_dir)
+        extracted = os.path.join(extract_dir, ffmpeg_in_zip)
+        if suffix != '.exe':
+            os.chmod(extracted, 0o755)
+        digest = file_sha256(extracted)
+        os.replace(extracted, exe)
+    st = os.stat(exe)
+    _write_json_atomic(manifest_path, {'archive': os.path.basename(zip_path), 'member': ffmpeg_in_zip,
+                                       'size': st.st_size, 'sha256': digest, 'stat': [st.st_size, st.st_mtime_ns]})
+    return exe, 'extracted'
+
+def _write_json_atomic(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+# ffmpeg: now you see me. report (a list) gets (label, seconds, note) for --startup-profile
 @contextlib.contextmanager
-def managed_ffmpeg():
+def managed_ffmpeg(report=None):
     sysname = platform.system().lower()
     arch = platform.machine().lower()
     ffmpeg_bin_dir = find_resource_path(os.path.join('ffmpeg_bin'))
@@ -83,77 +137,100 @@ def managed_ffmpeg():
         else:
             zip_path = os.path.join(ffmpeg_bin_dir, 'linux-32.7z')
             ffmpeg_in_zip = 'linux-32/ffmpeg'
-    ffmpeg_path = None
     original_ffmpeg_binary = os.environ.get('FFMPEG_BINARY')
+    t0 = time.perf_counter()
     try:
         if zip_path and ffmpeg_in_zip and os.path.exists(zip_path):
-            with tempfile.TemporaryDirectory() as extract_dir:
-                with py7zr.SevenZipFile(zip_path, 'r') as archive:
-                    archive.extract(targets=[ffmpeg_in_zip], path=extract_dir)
-                extracted_ffmpeg = os.path.join(extract_dir, ffmpeg_in_zip)
-                with open(extracted_ffmpeg, 'rb') as src_f, tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_f:
-                    tmp_f.write(src_f.read())
-                    ffmpeg_path = tmp_f.name
-            if sysname != 'windows':
-                os.chmod(ffmpeg_path, 0o755)
-            os.environ['FFMPEG_BINARY'] = ffmpeg_path
-            yield ffmpeg_path
+            ffmpeg_path, how = cached_ffmpeg(zip_path, ffmpeg_in_zip, suffix)
         else:
-            os.environ['FFMPEG_BINARY'] = 'ffmpeg'
-            yield 'ffmpeg'
+            ffmpeg_path, how = 'ffmpeg', 'from PATH'
+        if report is not None:
+            report.append(('ffmpeg', time.perf_counter() - t0, f'{how}: {ffmpeg_path}'))
+        os.environ['FFMPEG_BINARY'] = ffmpeg_path
+        yield ffmpeg_path
     finally:
-        if ffmpeg_path and os.path.exists(ffmpeg_path):
-            os.remove(ffmpeg_path)
         if original_ffmpeg_binary:
             os.environ['FFMPEG_BINARY'] = original_ffmpeg_binary
         elif 'FFMPEG_BINARY' in os.environ:
             del os.environ['FFMPEG_BINARY']
 
-# video to frames & noise
-def get_stuff_from_video(vid, out, speed=24, wide=160):
+# video to frames & noise. the video is cut into time segments that each get decoded (their own
+# ffmpeg) and converted by one pool worker, straight into frame_NNNNN.vmf (AsciiFrame.pack, zlib `level`)
+def get_stuff_from_video(vid, out, speed=24, wide=160, level=6):
     if not os.path.exists(out):
         os.makedirs(out)
     audio = os.path.join(out, 'audio.ogg')
     print('Doing video things...')
-    clip = VideoFileClip(vid)
-    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
-        clip.audio.write_audiofile(audio, codec='libvorbis')
-        frame_paths = []
-        for i, frame in enumerate(clip.iter_frames(fps=speed, dtype='uint8')):
-            img = Image.fromarray(frame)
-            ratio = img.height / img.width
-            tall = int(ratio * wide * 0.55)
-            img = img.resize((wide, tall))
-            frame_path = os.path.join(out, f'frame_{i+1:05d}.png')
-            img.save(frame_path)
-            frame_paths.append(frame_path)
-        with multiprocessing.Pool() as pool:
-            ascii_results = pool.map(convert_frame_to_ascii, [(fp, wide) for fp in frame_paths])
-        for i, (ascii_txt, _) in enumerate(ascii_results):
-            txt_path = os.path.join(out, f'frame_{i+1:05d}.txt')
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write(ascii_txt)
+    with SuppressStderr():
+        from moviepy import VideoFileClip  # video wrangler, only loaded when needed
+    import multiprocessing  # more chaos
+    info = probe_video(vid)
+    settings = settings_from_options(load_options())
+    size = pixel_grid(fit_grid(info['width'], info['height'], wide, 1 << 16), settings.chars)
+    total = int(info['duration'] * speed)
+    length = segment_length(total, speed, os.cpu_count() or 1)
+    segments = [(vid, size, speed, first, length if first + length < total else None, out, settings, level)
+                for first in range(0, max(1, total), length)]
+    with multiprocessing.Pool() as pool:
+        written = pool.map_async(convert_segment_to_files, segments)
+        if info['has_audio']:
+            clip = VideoFileClip(vid)  # audio while the workers do the frames
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                clip.audio.write_audiofile(audio, codec='libvorbis')
+            clip.close()
+        else:
+            audio = None
+        written.get()
     print('Done.')
     return out, audio
 
+# every option: default, type, sanity check (bad values fall back to the default)
+OPTION_SPECS = {
+    'chars': ("█▓▒░", str, lambda v: 0 < len(v) <= 256),  # glyph indices are one byte
+    'gamma': (1.2, float, lambda v: v > 0),
+    'contrast': (1.5, float, lambda v: v >= 0),
+    'temp': ('temp', str, lambda v: len(v) > 0),
+    'wide': (160, int, lambda v: v >= 10),
+    'fps': (24, int, lambda v: v >= 1),
+    'ascii_chars_set': ("default", str, lambda v: v in CHAR_SETS or v == 'custom'),
+    'audio_volume_start': (1.0, float, lambda v: 0.0 <= v <= 1.0),
+    'default_video_path': ("", str, lambda v: True),
+    'show_ui_on_start': (True, bool, lambda v: True),
+    'clear_screen_on_resize': (True, bool, lambda v: True),
+    'buffering_message': ("Buffering...", str, lambda v: True),
+    'seek_jump_seconds': (5, int, lambda v: v >= 1),
+    'fine_seek_seconds': (1, int, lambda v: v >= 1),
+    'delta_threshold': (0.5, float, lambda v: 0.0 <= v <= 1.0),
+    'cache_enabled': (True, bool, lambda v: True),
+    'cache_dir': ("", str, lambda v: True),
+    'cache_max_mb': (2048, int, lambda v: v >= 0),
+    'color_depth': ("auto", str, lambda v: v == 'auto' or v in COLOR_DEPTHS),
+    'render_workers': (-1, int, lambda v: v >= -1),
+    'seek_history_seconds': (5.0, float, lambda v: v >= 0),
+    'frame_drop_ms': (100, int, lambda v: v >= 0),
+    'show_hud': (False, bool, lambda v: True),
+    'trace_file': ("", str, lambda v: True),
+    'sync_output': (True, bool, lambda v: True),
+    'adaptive_quality': (True, bool, lambda v: True),
+    'halfblock_budget_kb': (128, int, lambda v: v >= 0),
+    'playlist_loop': (False, bool, lambda v: True),
+    'playlist_prefetch_mb': (64, int, lambda v: v >= 1),
+}
+
+# coerce one value, default if it won't behave
+def check_option(key, value):
+    default, cast, ok = OPTION_SPECS[key]
+    if value == '' or value is None:
+        return default
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        return default
+    return value if ok(value) else default
+
 # read config, hope for best
 def load_options(options_path='options.json'):
-    defaults = {
-        'chars': "█▓▒░",
-        'gamma': 1.2,
-        'contrast': 1.5,
-        'temp': 'temp',
-        'wide': 160,
-        'fps': 24,
-        'ascii_chars_set': "default",
-        'audio_volume_start': 1.0,
-        'default_video_path': "",
-        'show_ui_on_start': True,
-        'clear_screen_on_resize': True,
-        'buffering_message': "Buffering...",
-        'seek_jump_seconds': 5,
-        'fine_seek_seconds': 1
-    }
+    defaults = {k: spec[0] for k, spec in OPTION_SPECS.items()}
     if not os.path.exists(options_path):
         with open(options_path, 'w', encoding='utf-8') as f:
             json.dump(defaults, f, indent=2)
@@ -162,37 +239,528 @@ def load_options(options_path='options.json'):
         with open(options_path, 'r', encoding='utf-8') as f:
             opts = json.load(f)
         for k in defaults:
-            if k not in opts or opts[k] == '' or opts[k] is None:
-                opts[k] = defaults[k]
-        opts['gamma'] = float(opts['gamma'])
-        opts['contrast'] = float(opts['contrast'])
-        opts['wide'] = int(opts['wide'])
-        opts['fps'] = int(opts['fps'])
-        opts['audio_volume_start'] = float(opts['audio_volume_start'])
-        opts['seek_jump_seconds'] = int(opts['seek_jump_seconds'])
-        opts['fine_seek_seconds'] = int(opts['fine_seek_seconds'])
+            opts[k] = check_option(k, opts.get(k))
         return opts
     except Exception:
         return defaults
 
-# image to ascii, rainbow puke
-def pic_to_ascii_from_pil(pic, wide=None, high=None):
-    opts = load_options()
-    CHAR_SETS = {
-        "default": "█▓▒░",
-        "detailed": "$@B%8&WM#*oahkbdpqwmZO0QLCJUYXzcvunxrjft/\\|()1{}[]?-_+~<>i!lI;:,\"^`'. ",
-        "simple": " .:-=+*#%@"
-    }
+# not glyphs to pick from by brightness: '▀' with the top pixel as foreground and the one
+# below as background, so every cell shows two pixels. the rest are for mono (no colors to
+# do that with): which halves are lit
+HALF_BLOCKS = " ▀▄█"
+
+# glyph sets, densest first
+CHAR_SETS = {
+    "default": "█▓▒░",
+    "detailed": "$@B%8&WM#*oahkbdpqwmZO0QLCJUYXzcvunxrjft/\\|()1{}[]?-_+~<>i!lI;:,\"^`'. ",
+    "simple": " .:-=+*#%@",
+    "halfblock": HALF_BLOCKS,
+}
+
+def half_block(chars):
+    return chars == HALF_BLOCKS
+
+# color bytes stored per cell: fg rgb, or fg + bg rgb for half blocks
+def cell_channels(chars):
+    return 6 if half_block(chars) else 3
+
+# cell grid -> the pixel size the decoder has to deliver
+def pixel_grid(grid, chars):
+    return (grid[0], grid[1] * 2) if half_block(chars) else tuple(grid)
+
+# pick the glyphs the options ask for
+def chars_from_options(opts):
     chars_key = opts.get('ascii_chars_set', 'default')
     if chars_key == 'custom':
-        chars = opts.get('chars', CHAR_SETS['default'])
+        return opts.get('chars', CHAR_SETS['default'])
+    return CHAR_SETS.get(chars_key, CHAR_SETS['default'])
+
+# gamma + contrast baked into 256 entries, same float math as the old per-pixel pow()
+@functools.lru_cache(maxsize=16)
+def color_lut(gamma, contrast):
+    lut = np.empty(256, dtype=np.uint8)
+    for v in range(256):
+        c = int(255 * pow((v / 255), gamma) * contrast)
+        lut[v] = min(max(c, 0), 255)
+    return lut
+
+# gray level -> index into chars
+@functools.lru_cache(maxsize=16)
+def glyph_index_lut(n_chars):
+    return (np.arange(256) * (n_chars - 1) // 255).astype(np.uint8)
+
+# byte strings (<= 4 bytes each) packed into uint32 words + a keep-mask, so one
+# gather moves a whole segment and padding bytes get squeezed out at the end
+def _word_table(items):
+    data = np.zeros((len(items), 4), dtype=np.uint8)
+    mask = np.zeros((len(items), 4), dtype=np.uint8)
+    for i, b in enumerate(items):
+        data[i, :len(b)] = list(b)
+        mask[i, :len(b)] = 1
+    return data.view(np.uint32).reshape(-1), mask.view(np.uint32).reshape(-1)
+
+_SGR_PREFIX, _SGR_PREFIX_MASK = _word_table([b'\033[38', b';2;'])
+_SGR_BG_PREFIX, _SGR_BG_PREFIX_MASK = _word_table([b'\033[48', b';2;'])
+_SGR_256, _SGR_256_MASK = _word_table([b'\033[38', b';5;'])
+_SGR_BG_256, _SGR_BG_256_MASK = _word_table([b'\033[48', b';5;'])
+_SGR_CSI, _SGR_CSI_MASK = _word_table([b'\033['])
+_SGR_16, _SGR_16_MASK = _word_table([f'{30 + i}m'.encode('ascii') for i in range(8)] +
+                                    [f'{90 + i}m'.encode('ascii') for i in range(8)])
+_SGR_BG_16, _SGR_BG_16_MASK = _word_table([f'{40 + i}m'.encode('ascii') for i in range(8)] +
+                                          [f'{100 + i}m'.encode('ascii') for i in range(8)])
+_ROW_END, _ROW_END_MASK = _word_table([b'\n'])  # color carries over, it's only reset once per frame
+_NUM_SEMI, _NUM_SEMI_MASK = _word_table([f'{v};'.encode('ascii') for v in range(256)])
+_NUM_M, _NUM_M_MASK = _word_table([f'{v}m'.encode('ascii') for v in range(256)])
+_RESET_BYTES = Fore.RESET.encode('ascii')
+_HALF_RESET_BYTES = b'\033[39;49m'  # half blocks set a background too
+
+def _reset_bytes(chars):
+    return _HALF_RESET_BYTES if half_block(chars) else _RESET_BYTES
+
+# chars as utf-8 words, gathered by glyph index
+@functools.lru_cache(maxsize=16)
+def glyph_table(chars):
+    return _word_table([c.encode('utf-8') for c in chars])
+
+# how many colors the output uses; 'auto' asks the environment
+COLOR_DEPTHS = ('truecolor', '256', '16', 'mono')
+
+def detect_color_depth(environ=None):
+    env = os.environ if environ is None else environ
+    if env.get('COLORTERM', '').lower() in ('truecolor', '24bit'):
+        return 'truecolor'
+    term = env.get('TERM', '').lower()
+    if not term:
+        return 'truecolor'  # windows terminal / conhost don't set TERM and do 24-bit
+    if term == 'dumb':
+        return 'mono'
+    if '256color' in term or 'direct' in term:
+        return '256'
+    return '16'
+
+def resolve_color_depth(depth):
+    return detect_color_depth() if depth == 'auto' else depth
+
+# xterm's default 16, then the 6x6x6 cube + gray ramp that make up 16..255
+_XTERM16 = [(0, 0, 0), (205, 0, 0), (0, 205, 0), (205, 205, 0), (0, 0, 238), (205, 0, 205), (0, 205, 205),
+            (229, 229, 229), (127, 127, 127), (255, 0, 0), (0, 255, 0), (255, 255, 0), (92, 92, 255),
+            (255, 0, 255), (0, 255, 255), (255, 255, 255)]
+_CUBE_LEVELS = (0, 95, 135, 175, 215, 255)
+
+# rgb (5 bits a channel) -> nearest palette index, weighted so green counts most.
+# 256 mode only picks from 16..255, the low 16 change with every terminal theme
+@functools.lru_cache(maxsize=4)
+def palette_lut(depth):
+    if depth == '16':
+        pal, first = _XTERM16, 0
     else:
-        chars = CHAR_SETS.get(chars_key, CHAR_SETS['default'])
-    gamma = float(opts['gamma'])
-    contrast = float(opts['contrast'])
+        pal = [(r, g, b) for r in _CUBE_LEVELS for g in _CUBE_LEVELS for b in _CUBE_LEVELS]
+        pal += [(v, v, v) for v in range(8, 248, 10)]
+        first = 16
+    pal = np.array(pal, dtype=np.int32)
+    levels = (np.arange(32, dtype=np.int32) << 3) + 4
+    grid = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+    weights = np.array([2, 4, 3], dtype=np.int32)
+    lut = np.empty(len(grid), dtype=np.uint8)
+    for a in range(0, len(grid), 4096):
+        dist = ((grid[a:a + 4096, None, :] - pal[None]) ** 2 * weights).sum(axis=-1)
+        lut[a:a + 4096] = dist.argmin(axis=1) + first
+    return lut
+
+# final colors -> one int per cell; equal codes print the same, so no SGR needed between them.
+# half blocks (6 channels): fg code << 24 | bg code, one compare covers both
+def color_codes(rgb, depth):
+    if rgb.shape[-1] == 6:
+        return (color_codes(rgb[..., :3], depth).astype(np.int64) << 24) | color_codes(rgb[..., 3:], depth)
+    if depth == 'mono':
+        return np.zeros(rgb.shape[:-1], dtype=np.int32)
+    r = rgb[..., 0].astype(np.int32)
+    g = rgb[..., 1].astype(np.int32)
+    b = rgb[..., 2].astype(np.int32)
+    if depth == 'truecolor':
+        return (r << 16) | (g << 8) | b
+    return palette_lut(depth)[((r >> 3) << 10) | ((g >> 3) << 5) | (b >> 3)].astype(np.int32)
+
+# sgr words per cell at each depth (the glyph is one more)
+_SGR_WORDS = {'truecolor': 5, '256': 3, '16': 2, 'mono': 0}
+
+# words per cell: sgr (twice for half blocks, fg + bg) + glyph
+def _cell_words(chars, depth):
+    return _SGR_WORDS[depth] * (2 if half_block(chars) else 1) + 1
+
+# (words, keep-mask) columns of one color's sgr at the depth
+def _sgr_columns(rgb, depth, codes, background=False):
+    if depth == 'truecolor':
+        prefix, mask = (_SGR_BG_PREFIX, _SGR_BG_PREFIX_MASK) if background else (_SGR_PREFIX, _SGR_PREFIX_MASK)
+        return [(prefix[0], mask[0]), (prefix[1], mask[1]),
+                (_NUM_SEMI[rgb[..., 0]], _NUM_SEMI_MASK[rgb[..., 0]]),
+                (_NUM_SEMI[rgb[..., 1]], _NUM_SEMI_MASK[rgb[..., 1]]),
+                (_NUM_M[rgb[..., 2]], _NUM_M_MASK[rgb[..., 2]])]
+    if depth == '256':
+        prefix, mask = (_SGR_BG_256, _SGR_BG_256_MASK) if background else (_SGR_256, _SGR_256_MASK)
+        return [(prefix[0], mask[0]), (prefix[1], mask[1]), (_NUM_M[codes], _NUM_M_MASK[codes])]
+    if depth == '16':
+        table, mask = (_SGR_BG_16, _SGR_BG_16_MASK) if background else (_SGR_16, _SGR_16_MASK)
+        return [(_SGR_CSI[0], _SGR_CSI_MASK[0]), (table[codes], mask[codes])]
+    return []
+
+# drop the sgr columns `part` wherever the cell before (in output order) had the same code
+def _skip_repeats(keep, part, codes):
+    flat = codes.reshape(-1)
+    same = np.zeros(flat.shape, dtype=bool)
+    same[1:] = flat[1:] == flat[:-1]
+    keep[..., part][same.reshape(codes.shape)] = 0
+
+# write cell words [sgr words for the depth..., glyph] into a (..., _cell_words()) view,
+# for data and keep-mask. An sgr is dropped when the cell before it (in output order)
+# already set the same color
+def _fill_cells(data, keep, glyphs, rgb, chars, depth, codes):
+    if half_block(chars):
+        return _fill_half_cells(data, keep, glyphs, rgb, chars, depth, codes)
+    sgr = _sgr_columns(rgb, depth, codes)
+    gdata, gmask = glyph_table(chars)
+    k = len(sgr)
+    for j, (words, mask) in enumerate(sgr):
+        data[..., j] = words
+        keep[..., j] = mask
+    data[..., k] = gdata[glyphs]
+    keep[..., k] = gmask[glyphs]
+    if k:
+        _skip_repeats(keep, slice(0, k), codes)
+
+# half blocks: [fg sgr..., bg sgr..., '▀'], fg and bg skipped separately, so a flat
+# background costs nothing per cell. mono has no colors, the glyph says which halves are lit
+def _fill_half_cells(data, keep, glyphs, rgb, chars, depth, codes):
+    gdata, gmask = glyph_table(chars)
+    if depth == 'mono':
+        data[..., 0] = gdata[glyphs]
+        keep[..., 0] = gmask[glyphs]
+        return
+    fg, bg = codes >> 24, codes & 0xFFFFFF
+    sgr = _sgr_columns(rgb[..., :3], depth, fg) + _sgr_columns(rgb[..., 3:], depth, bg, background=True)
+    k = len(sgr) // 2
+    for j, (words, mask) in enumerate(sgr):
+        data[..., j] = words
+        keep[..., j] = mask
+    data[..., 2 * k] = gdata[1]
+    keep[..., 2 * k] = gmask[1]
+    _skip_repeats(keep, slice(0, k), fg)
+    _skip_repeats(keep, slice(k, 2 * k), bg)
+
+def _squeeze(data, keep):
+    return data.view(np.uint8).reshape(-1)[keep.view(np.uint8).reshape(-1).view(bool)]
+
+# glyph indices + final colors -> ansi bytes, built as one word matrix then squeezed
+def cells_to_bytes(glyphs, rgb, chars, depth='truecolor'):
+    tall, wide = glyphs.shape
+    cell_words = _cell_words(chars, depth)
+    row_words = wide * cell_words
+    data = np.empty((tall, row_words + 1), dtype=np.uint32)
+    keep = np.empty((tall, row_words + 1), dtype=np.uint32)
+    _fill_cells(data[:, :row_words].reshape(tall, wide, cell_words),
+                keep[:, :row_words].reshape(tall, wide, cell_words),
+                glyphs, rgb, chars, depth, color_codes(rgb, depth))
+    data[:, row_words] = _ROW_END[0]
+    keep[:, row_words] = _ROW_END_MASK[0]
+    return _squeeze(data, keep).tobytes() + _reset_bytes(chars)
+
+def cells_to_ansi(glyphs, rgb, chars, depth='truecolor'):
+    return cells_to_bytes(glyphs, rgb, chars, depth).decode('utf-8')
+
+# color values with the low `bits` dropped (rounded to the middle of what's left)
+@functools.lru_cache(maxsize=8)
+def quantize_lut(bits):
+    v = np.arange(256) >> bits << bits
+    return np.minimum(v + (1 << bits >> 1), 255).astype(np.uint8)
+
+# only redraw what changed: keeps the last frame's glyphs/color codes and emits
+# cursor moves + cells for changed runs, full redraw past `threshold` changed.
+# budget (bytes/frame, 0 = none): running over it on average makes the next frames drop
+# low color bits, so neighbours share an sgr more often and fewer cells count as changed
+class DeltaRenderer:
+    MAX_QUANT = 5
+    QUANT_HOLD = 12  # frames between steps, so one big full redraw doesn't move it
+
+    def __init__(self, threshold=0.5, depth='truecolor', budget=0):
+        self.threshold = threshold
+        self.depth = depth
+        self.budget = budget
+        self.quant = 0  # color bits dropped right now
+        self.avg_bytes = None
+        self.quant_age = 0
+        self.prev_glyphs = None
+        self.prev_codes = None
+        self.prev_colors = None
+        self.prev_quant = 0
+        self.prev_chars = None
+        self.prev_depth = None
+        self.last_bytes = 0
+        self.total_bytes = 0
+        self.frames = 0
+        self.full_frames = 0
+
+    # next frame is a full redraw (screen got cleared or scribbled on)
+    def invalidate(self):
+        self.prev_glyphs = None
+
+    def _full(self, glyphs, colors, chars, full=None):
+        self.full_frames += 1
+        return full if full is not None else cells_to_bytes(glyphs, colors, chars, self.depth)
+
+    # compares palette codes, so at 256/16 colors a shade change that maps to the same entry is free
+    def _changed(self, glyphs, colors, codes, chars):
+        if self.threshold <= 0 or self.prev_glyphs is None or chars != self.prev_chars \
+                or self.depth != self.prev_depth or glyphs.shape != self.prev_glyphs.shape:
+            return None
+        prev_codes = self.prev_codes
+        if self.quant != self.prev_quant:
+            # only the rounding moved: compare both at the coarser one, or it's a full redraw
+            lut = quantize_lut(max(self.quant, self.prev_quant))
+            codes, prev_codes = color_codes(lut[colors], self.depth), color_codes(lut[self.prev_colors], self.depth)
+        if half_block(chars) and self.depth != 'mono':
+            changed = codes != prev_codes  # always '▀' here, the lit bits never reach the screen
+        else:
+            changed = (glyphs != self.prev_glyphs) | (codes != prev_codes)
+        if changed.mean() > self.threshold:
+            return None
+        return changed
+
+    # cells starting at the frame's top-left (cursor home); returns bytes, cursor ends below the frame.
+    # `full` is the frame's cells_to_bytes() if something already built it
+    def render_bytes(self, glyphs, colors, chars, full=None):
+        tall, wide = glyphs.shape
+        if self.quant:
+            colors = quantize_lut(self.quant)[colors]
+            full = None  # made from the exact colors
+        codes = color_codes(colors, self.depth)
+        changed = self._changed(glyphs, colors, codes, chars)
+        if changed is None:
+            out = self._full(glyphs, colors, chars, full)
+        else:
+            idx = np.flatnonzero(changed)
+            pieces = []
+            if len(idx):
+                n = len(idx)
+                # sgr state survives cursor moves, so repeats are skipped across runs too
+                data = np.empty((n, _cell_words(chars, self.depth)), dtype=np.uint32)
+                keep = np.empty((n, _cell_words(chars, self.depth)), dtype=np.uint32)
+                _fill_cells(data, keep, glyphs.reshape(-1)[idx], colors.reshape(-1, colors.shape[-1])[idx], chars,
+                            self.depth, codes.reshape(-1)[idx])
+                raw = _squeeze(data, keep).tobytes()
+                ends = np.cumsum(keep.view(np.uint8).reshape(n, -1).sum(axis=1, dtype=np.int64))
+                # a run breaks on a gap or at a row start (the cursor doesn't wrap for us)
+                starts = np.ones(n, dtype=bool)
+                starts[1:] = (np.diff(idx) != 1) | (idx[1:] % wide == 0)
+                run_starts = np.flatnonzero(starts)
+                run_ends = np.append(run_starts[1:], n)
+                for a, b in zip(run_starts.tolist(), run_ends.tolist()):
+                    cell = int(idx[a])
+                    pieces.append(b'\033[%d;%dH' % (cell // wide + 1, cell % wide + 1))
+                    pieces.append(raw[ends[a - 1] if a else 0:ends[b - 1]])
+            pieces.append(_reset_bytes(chars) + b'\033[%d;1H' % (tall + 1))
+            out = b''.join(pieces)
+        self.prev_glyphs = glyphs.copy()
+        self.prev_codes = codes
+        self.prev_colors = colors
+        self.prev_quant = self.quant
+        self.prev_chars = chars
+        self.prev_depth = self.depth
+        self.last_bytes = len(out)
+        self.total_bytes += len(out)
+        self.frames += 1
+        self._fit_budget(len(out))
+        return out
+
+    # one step at a time on the running average; coming back down only once well under
+    def _fit_budget(self, n):
+        self.avg_bytes = n if self.avg_bytes is None else self.avg_bytes * 0.8 + n * 0.2
+        self.quant_age += 1
+        if self.budget <= 0:
+            self.quant = 0
+        elif self.quant_age < self.QUANT_HOLD:
+            return
+        elif self.avg_bytes > self.budget and self.quant < self.MAX_QUANT:
+            self.quant += 1
+            self.quant_age = 0
+        elif self.avg_bytes < self.budget * 0.6 and self.quant > 0:
+            self.quant -= 1
+            self.quant_age = 0
+
+    def render(self, glyphs, colors, chars, full=None):
+        return self.render_bytes(glyphs, colors, chars, full).decode('utf-8')
+
+# everything for one tick (cursor moves, frame, status bar) goes into one reused buffer,
+# then out with a single os.write. sync=True wraps it in DEC 2026 synchronized output so the
+# terminal shows the whole frame at once (terminals that don't know the mode ignore it)
+class TerminalWriter:
+    SYNC_BEGIN = b'\033[?2026h'
+    SYNC_END = b'\033[?2026l'
+
+    def __init__(self, fd=None, sync=True, capacity=1 << 20, window=120):
+        sys.stdout.flush()  # anything print()ed before us goes out first
+        self.fd = sys.stdout.fileno() if fd is None else fd
+        self.sync = sync
+        self.buf = bytearray(capacity)
+        self.buf[:len(self.SYNC_BEGIN)] = self.SYNC_BEGIN  # always there, only sent when sync is on
+        self.start = len(self.SYNC_BEGIN)
+        self.size = self.start
+        self.blocked = collections.deque(maxlen=window)  # seconds each flush spent in write
+        self.blocked_total = 0.0
+        self.blocked_max = 0.0
+        self.flushes = 0
+        self.last_bytes = 0
+
+    def add(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        end = self.size + len(data)
+        if end > len(self.buf):
+            self.buf.extend(bytes(max(end, 2 * len(self.buf)) - len(self.buf)))  # grow by doubling
+        self.buf[self.size:end] = data
+        self.size = end
+
+    def _write(self, view):
+        if os.name == 'nt':  # console wants text, not bytes in the ANSI code page
+            sys.stdout.write(view.tobytes().decode('utf-8'))
+            sys.stdout.flush()
+            return
+        while len(view):
+            view = view[os.write(self.fd, view):]  # a full pty buffer can take it in pieces
+
+    # returns seconds spent blocked in the write
+    def flush(self):
+        if self.size == self.start:
+            return 0.0
+        if self.sync:
+            self.add(self.SYNC_END)
+        begin = 0 if self.sync else self.start
+        t = time.perf_counter()
+        with memoryview(self.buf) as view:
+            self._write(view[begin:self.size])
+        took = time.perf_counter() - t
+        self.last_bytes = self.size - begin
+        self.size = self.start
+        self.blocked.append(took)
+        self.blocked_total += took
+        self.blocked_max = max(self.blocked_max, took)
+        self.flushes += 1
+        return took
+
+    def stats(self):
+        return {
+            'write_ms_mean': self.blocked_total / self.flushes * 1000 if self.flushes else 0.0,
+            'write_ms_max': self.blocked_max * 1000,
+        }
+
+# everything the renderer derives from the options, built once per change
+RenderSettings = collections.namedtuple('RenderSettings', ['chars', 'gamma', 'contrast', 'glyph_lut', 'color_lut'])
+
+def render_settings(chars, gamma, contrast):
+    return RenderSettings(chars, gamma, contrast, glyph_index_lut(len(chars)), color_lut(gamma, contrast))
+
+def settings_from_options(opts):
+    return render_settings(chars_from_options(opts), opts['gamma'], opts['contrast'])
+
+# options loaded once, re-read only when options.json's mtime moves
+class OptionsWatcher:
+    def __init__(self, options_path='options.json', check_every=0.5):
+        self.path = options_path
+        self.check_every = check_every
+        self.opts = load_options(options_path)
+        self.mtime = self._mtime()
+        self.last_check = time.monotonic()
+        self.reloads = 0
+        self._render_key = None
+        self._render = None
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    # one stat every check_every seconds, a json read only if the file changed
+    def refresh(self):
+        now = time.monotonic()
+        if now - self.last_check < self.check_every:
+            return False
+        self.last_check = now
+        mtime = self._mtime()
+        if mtime == self.mtime:
+            return False
+        self.opts = load_options(self.path)
+        self.mtime = self._mtime()
+        self.reloads += 1
+        return True
+
+    def __getitem__(self, key):
+        return self.opts[key]
+
+    def get(self, key, default=None):
+        return self.opts.get(key, default)
+
+    # luts only get rebuilt when chars/gamma/contrast actually change
+    @property
+    def render(self):
+        key = (chars_from_options(self.opts), self.opts['gamma'], self.opts['contrast'])
+        if key != self._render_key:
+            self._render = render_settings(*key)
+            self._render_key = key
+        return self._render
+
+# resized gray + rgb arrays -> glyph indices + final colors (4 bytes per cell)
+def frame_to_cells(gray, rgb, settings):
+    return settings.glyph_lut[gray], settings.color_lut[rgb]
+
+# resized gray + rgb arrays -> ansi frame
+def frame_to_ascii(gray, rgb, settings):
+    return cells_to_ansi(*frame_to_cells(gray, rgb, settings), settings.chars)
+
+# terminal size, looked up once and then only again after a SIGWINCH says it changed
+# (instead of an ioctl per frame). no SIGWINCH on Windows or off the main thread: there it's
+# looked up again at most every `recheck` seconds. listeners get called from the signal handler
+class TerminalGeometry:
+    def __init__(self, recheck=0.25):
+        self.size = None
+        self.dirty = True
+        self.recheck = recheck
+        self.checked = 0.0
+        self.watching = False
+        self.listeners = []
+
+    def _watch(self):
+        if not hasattr(signal, 'SIGWINCH') or threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGWINCH)
+
+        def changed(signum, frame):
+            self.dirty = True
+            for listener in list(self.listeners):
+                listener()
+            if callable(previous):
+                previous(signum, frame)
+        signal.signal(signal.SIGWINCH, changed)
+        self.watching = True
+
+    def get(self):
+        if not self.watching:
+            self._watch()
+            if not self.watching and time.monotonic() - self.checked >= self.recheck:
+                self.dirty = True
+        if self.dirty:
+            self.dirty = False  # before the lookup, so a resize during it isn't lost
+            self.checked = time.monotonic()
+            self.size = shutil.get_terminal_size()
+        return self.size
+
+TERMINAL = TerminalGeometry()
+
+# how many cells a picture gets: terminal size (unless given), aspect kept,
+# 0.55 because terminal cells are taller than wide
+def fit_grid(pic_w, pic_h, wide=None, high=None):
     if wide is None or high is None:
         try:
-            size = shutil.get_terminal_size()
+            size = TERMINAL.get()
             term_w = int(size.columns * 0.9)
             term_h = int(size.lines * 0.9)
             if wide is None:
@@ -204,43 +772,163 @@ def pic_to_ascii_from_pil(pic, wide=None, high=None):
                 wide = 160
             if high is None:
                 high = 24
-    ratio = pic.height / pic.width
+    ratio = pic_h / pic_w
     tall = int(ratio * wide * 0.55)
     if tall > high:
         tall = high
         wide = int(tall / (ratio * 0.55))
-    gray = pic.convert('L').resize((wide, tall))
-    color = pic.convert('RGB').resize((wide, tall))
-    px = list(gray.getdata())
-    px_color = list(color.getdata())
-    out = ''
-    for i, (p, rgb) in enumerate(zip(px, px_color)):
-        r, g, b = rgb
-        r = int(255 * pow((r / 255), gamma) * contrast)
-        g = int(255 * pow((g / 255), gamma) * contrast)
-        b = int(255 * pow((b / 255), gamma) * contrast)
-        r = min(max(r, 0), 255)
-        g = min(max(g, 0), 255)
-        b = min(max(b, 0), 255)
-        out += f'\033[38;2;{r};{g};{b}m{chars[p * (len(chars) - 1) // 255]}'
-        if (i + 1) % wide == 0:
-            out += Fore.RESET + '\n'
-    out += Fore.RESET
-    return out, wide
+    return wide, tall
+
+# grid for the player: options width, but never wider than the terminal
+# (wrapped rows break cursor-addressed delta frames)
+def playback_grid(pic_w, pic_h, wide=None):
+    if wide is not None:
+        wide = min(wide, max(20, TERMINAL.get().columns))
+    return fit_grid(pic_w, pic_h, wide)
+
+# image to ascii, rainbow puke (now in bulk)
+def pic_to_ascii_from_pil(pic, wide=None, high=None, settings=None):
+    if settings is None:
+        settings = settings_from_options(load_options())
+    wide, tall = fit_grid(pic.width, pic.height, wide, high)
+    small = pic.convert('RGB').resize(pixel_grid((wide, tall), settings.chars))  # one resize
+    if half_block(settings.chars):
+        return grid_frame_to_ascii(np.asarray(small), settings), wide
+    return frame_to_ascii(np.asarray(small.convert('L')), np.asarray(small), settings), wide
+
+# frame that is already one pixel per cell (decoder output) -> glyphs + colors.
+# PIL's L conversion is the same ITU-R 601 luma numpy would do, just faster
+def grid_frame_to_cells(frame, settings):
+    if half_block(settings.chars):
+        return half_frame_to_cells(frame, settings)
+    from PIL import Image  # pixel wizard
+    gray = np.asarray(Image.fromarray(frame).convert('L'))
+    return frame_to_cells(gray, frame, settings)
+
+# two pixel rows per cell -> glyphs (lit halves, for mono) + top rgb | bottom rgb colors
+def half_frame_to_cells(frame, settings):
+    from PIL import Image  # pixel wizard
+    frame = frame[:frame.shape[0] // 2 * 2]  # an odd last row has no partner, it goes
+    lit = settings.color_lut[np.asarray(Image.fromarray(frame).convert('L'))] >= 128
+    glyphs = lit[0::2].astype(np.uint8) | (lit[1::2].astype(np.uint8) << 1)
+    colors = np.empty((frame.shape[0] // 2, frame.shape[1], 6), dtype=np.uint8)
+    colors[..., :3] = settings.color_lut[frame[0::2]]
+    colors[..., 3:] = settings.color_lut[frame[1::2]]
+    return glyphs, colors
+
+def grid_frame_to_ascii(frame, settings):
+    return cells_to_ansi(*grid_frame_to_cells(frame, settings), settings.chars)
+
+# same frames every run (seeded), gradient + noise so every cell changes color
+def synthetic_frames(count=8, size=(320, 180)):
+    from PIL import Image  # pixel wizard
+    yy, xx = np.mgrid[0:size[1], 0:size[0]]
+    rng = np.random.default_rng(0)
+    frames = []
+    for k in range(count):
+        rgb = np.stack([(xx + k * 16) % 256, (yy + k * 8) % 256, (xx + yy) // 2 % 256], axis=-1)
+        rgb = (rgb + rng.integers(0, 32, rgb.shape)).clip(0, 255).astype(np.uint8)
+        frames.append(Image.fromarray(rgb))
+    return frames
+
+# how fast can we draw? synthetic frames, no terminal, frames/sec out
+def bench_render(wide=320, seconds=3.0):
+    high = int(wide * 9 / 16 * 0.55) + 1
+    frames = synthetic_frames()
+    settings = settings_from_options(load_options())
+    n = 0
+    out_bytes = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        out, _ = pic_to_ascii_from_pil(frames[n % len(frames)], wide, high, settings)
+        out_bytes += len(out.encode('utf-8'))
+        n += 1
+    elapsed = time.perf_counter() - t0
+    print(f'{wide} cols: {n / elapsed:.1f} frames/sec, {out_bytes / n / 1024:.1f} KiB/frame')
+    return n / elapsed
+
+# one converted frame, kept as arrays: glyph indices + final colors (4 bytes a cell, 7 for half
+# blocks) instead of ~20 bytes of escapes. the escapes get made when it's drawn, at whatever depth.
+# pack() is a small header + the arrays, zlib'd per frame (level 0 = stored as is)
+class AsciiFrame:
+    __slots__ = ('glyphs', 'colors', 'chars')
+    MAGIC = b'VMF1'
+    HEAD = struct.Struct('<4sBHHH')  # magic, zlib'd?, tall, wide, chars length (utf-8 bytes)
+
+    def __init__(self, glyphs, colors, chars):
+        self.glyphs = glyphs
+        self.colors = colors
+        self.chars = chars
+
+    @classmethod
+    def from_pil(cls, pic, wide=None, high=None, settings=None):
+        if settings is None:
+            settings = settings_from_options(load_options())
+        wide, tall = fit_grid(pic.width, pic.height, wide, high)
+        small = np.asarray(pic.convert('RGB').resize(pixel_grid((wide, tall), settings.chars)))
+        return cls(*grid_frame_to_cells(small, settings), settings.chars)
+
+    @property
+    def nbytes(self):
+        return self.glyphs.nbytes + self.colors.nbytes
+
+    def to_bytes(self, depth='truecolor'):
+        return cells_to_bytes(self.glyphs, self.colors, self.chars, depth)
+
+    def to_ansi(self, depth='truecolor'):
+        return self.to_bytes(depth).decode('utf-8')
+
+    def pack(self, level=6):
+        chars = self.chars.encode('utf-8')
+        body = self.glyphs.tobytes() + self.colors.tobytes()
+        if level:
+            import zlib  # only frames on disk need it
+            body = zlib.compress(body, level)
+        tall, wide = self.glyphs.shape
+        return self.HEAD.pack(self.MAGIC, bool(level), tall, wide, len(chars)) + chars + body
+
+    @classmethod
+    def unpack(cls, data):
+        magic, packed, tall, wide, chars_len = cls.HEAD.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError('not a vidminal frame')
+        start = cls.HEAD.size + chars_len
+        chars = bytes(data[cls.HEAD.size:start]).decode('utf-8')
+        body = data[start:]
+        if packed:
+            import zlib  # only frames on disk need it
+            body = zlib.decompress(body)
+        n = tall * wide
+        glyphs = np.frombuffer(body, dtype=np.uint8, count=n).reshape(tall, wide)
+        colors = np.frombuffer(body, dtype=np.uint8, offset=n).reshape(tall, wide, cell_channels(chars))
+        return cls(glyphs, colors, chars)
+
+    def save(self, path, level=6):
+        with open(path, 'wb') as f:
+            f.write(self.pack(level))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.unpack(f.read())
 
 # open image, get ascii
-def pic_to_ascii(img, wide=None, high=None):
+def pic_to_ascii(img, wide=None, high=None, settings=None):
+    from PIL import Image  # pixel wizard
     pic = Image.open(img)
-    return pic_to_ascii_from_pil(pic, wide, high)
+    return pic_to_ascii_from_pil(pic, wide, high, settings)
 
-# frame to ascii, multiprocessing pain
-def convert_frame_to_ascii(args):
-    frame_path, wide = args
-    pic = Image.open(frame_path)
-    return pic_to_ascii_from_pil(pic, wide)
+# one time segment -> frame_NNNNN.vmf files (numbered from the start of the video), in a pool worker
+def convert_segment_to_files(args):
+    vid, size, fps, first, count, out, settings, level = args
+    n = 0
+    for n, (glyphs, colors) in enumerate(segment_cells(vid, size, fps, first, count, settings), 1):
+        AsciiFrame(glyphs, colors, settings.chars).save(os.path.join(out, f'frame_{first + n:05d}.vmf'), level)
+    return n
 
 # play sound, hope for best
 def play_sound(audio, pause_flag, stop_flag):
+    import pygame  # sound go beep
     pygame.mixer.init()
     pygame.mixer.music.load(audio)
     pygame.mixer.music.play()
@@ -262,25 +950,157 @@ def play_sound(audio, pause_flag, stop_flag):
     pygame.mixer.music.stop()
     pygame.mixer.quit()
 
-# get one char, maybe
-def getch():
-    if platform.system() == 'Windows':
+# keyboard for a whole playback. cbreak is set once (not per key: that flushed typed-ahead
+# keys and left echo on in between), a thread blocks in select on stdin, and a small state
+# machine turns escape sequences into key names even when they arrive split across reads.
+# keys come out in order through get()/drain(); wait() sleeps until one is there
+class KeyReader:
+    CSI_KEYS = {'A': 'up', 'B': 'down', 'C': 'right', 'D': 'left', 'H': 'home', 'F': 'end'}
+    TILDE_KEYS = {'1': 'home', '2': 'insert', '3': 'delete', '4': 'end', '5': 'pageup', '6': 'pagedown'}
+    WIN_KEYS = {'H': 'up', 'P': 'down', 'M': 'right', 'K': 'left', 'G': 'home', 'O': 'end'}
+
+    def __init__(self, fd=None, esc_timeout=0.05):
+        self.events = collections.deque()
+        self.cond = threading.Condition()
+        self.esc_timeout = esc_timeout  # a lone ESC is the Esc key once nothing follows it
+        self.state = 'ground'
+        self.seq = ''
+        self.fd = self.old_attrs = self.thread = None
+        self.wake = None
+        self.closed = False
+        if os.name == 'nt':
+            target = self._run_windows
+        else:
+            try:
+                self.fd = sys.stdin.fileno() if fd is None else fd
+            except (AttributeError, ValueError, OSError):
+                return  # no stdin at all, no keys
+            import termios, tty
+            try:
+                self.old_attrs = termios.tcgetattr(self.fd)
+                tty.setcbreak(self.fd, termios.TCSANOW)  # TCSANOW: keep whatever was typed already
+            except termios.error:
+                pass  # not a terminal (piped in), just read it as it comes
+            self.wake = os.pipe()  # close() writes here to get the thread out of select
+            target = self._run
+        atexit.register(self.close)  # crash or ctrl+c: the terminal still gets its echo back
+        self.thread = threading.Thread(target=target, daemon=True, name='keys')
+        self.thread.start()
+
+    def _run(self):
+        import codecs
+        import selectors
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        with selectors.DefaultSelector() as sel:
+            sel.register(self.fd, selectors.EVENT_READ)
+            sel.register(self.wake[0], selectors.EVENT_READ)
+            while not self.closed:
+                # halfway through a sequence: only wait a moment for the rest
+                ready = sel.select(None if self.state == 'ground' else self.esc_timeout)
+                if not ready:
+                    self._timeout()
+                    continue
+                if any(key.fd == self.wake[0] for key, _ in ready):
+                    return
+                try:
+                    data = os.read(self.fd, 1024)
+                except OSError:
+                    data = b''
+                if not data:
+                    return  # stdin closed
+                for ch in decoder.decode(data):
+                    self._feed(ch)
+
+    def _run_windows(self):
         import msvcrt
-        if msvcrt.kbhit():
-            return msvcrt.getch().decode('utf-8', errors='ignore')
-        return None
-    else:
-        import sys, select, tty, termios
-        fd = sys.stdin.fileno()
-        old = termios.tcgetattr(fd)
-        try:
-            tty.setcbreak(fd)
-            dr, _, _ = select.select([sys.stdin], [], [], 0)
-            if dr:
-                return sys.stdin.read(1)
-            return None
-        finally:
-            termios.tcsetattr(fd, termios.TCSADRAIN, old)
+        while not self.closed:
+            if msvcrt.kbhit():
+                self._feed(msvcrt.getwch())
+            else:
+                time.sleep(0.01)  # the console can't be select()ed, a short poll it is
+
+    def _feed(self, ch):
+        state, self.state = self.state, 'ground'
+        if state == 'esc':
+            if ch in '[O':
+                self.state, self.seq = ('csi' if ch == '[' else 'ss3'), ''
+                return
+            self.put('esc')  # ESC + something else (alt+key): the Esc, then the key itself
+        elif state == 'csi':
+            if '\x40' <= ch <= '\x7e':  # final byte, numbers/; before it are parameters
+                key = self.TILDE_KEYS.get(self.seq.split(';')[0]) if ch == '~' else self.CSI_KEYS.get(ch)
+                if key:
+                    self.put(key)
+            elif len(self.seq) < 16:
+                self.state, self.seq = 'csi', self.seq + ch
+            return  # unknown sequences are swallowed whole, never leak out as letters
+        elif state == 'ss3':
+            key = self.CSI_KEYS.get(ch)
+            if key:
+                self.put(key)
+            return
+        elif state == 'win':
+            key = self.WIN_KEYS.get(ch)
+            if key:
+                self.put(key)
+            return
+        if ch == '\x1b':
+            self.state = 'esc'
+        elif ch in '\xe0\x00' and os.name == 'nt':
+            self.state = 'win'  # msvcrt: arrows are a prefix char + a code
+        else:
+            self.put(ch)
+
+    # nothing came after the ESC in time: it was the Esc key (a cut-off sequence is dropped)
+    def _timeout(self):
+        if self.state == 'esc':
+            self.put('esc')
+        self.state = 'ground'
+
+    # also for events that aren't keys (a resize), so they wake the player the same way
+    def put(self, key):
+        with self.cond:
+            self.events.append(key)
+            self.cond.notify_all()
+
+    # True as soon as a key is waiting, False after timeout without one
+    def wait(self, timeout=None):
+        with self.cond:
+            return bool(self.cond.wait_for(lambda: self.events, timeout))
+
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.events, timeout):
+                return None
+            return self.events.popleft()
+
+    def drain(self):
+        with self.cond:
+            keys = list(self.events)
+            self.events.clear()
+            return keys
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        if self.wake is not None:
+            os.write(self.wake[1], b'x')
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+        if self.old_attrs is not None:
+            import termios
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_attrs)
+        if self.wake is not None:
+            for fd in self.wake:
+                os.close(fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 # clear screen, magic
 def clear_terminal():
@@ -288,17 +1108,21 @@ def clear_terminal():
 
 # play ascii frames, chaos
 def play_ascii_video_stream(folder, audio, speed=24, wide=160, buffer_size=24):
+    import pygame  # sound go beep
     pygame.mixer.init()
     delay = 1.0 / speed
-    frames = sorted([f for f in os.listdir(folder) if f.startswith('frame_') and f.endswith('.txt')])
+    frames = sorted([f for f in os.listdir(folder) if f.startswith('frame_') and f.endswith(('.vmf', '.txt'))])
+    depth = resolve_color_depth(load_options()['color_depth'])
     total = len(frames)
     stop_flag = threading.Event()
     pause_flag = threading.Event()
     pause_flag.clear()
 
+    keys = KeyReader()
+
     def keyboard_listener():
         while not stop_flag.is_set():
-            key = getch()
+            key = keys.get(timeout=0.25)
             if key == ' ':
                 if pause_flag.is_set():
                     pause_flag.clear()
@@ -306,7 +1130,6 @@ def play_ascii_video_stream(folder, audio, speed=24, wide=160, buffer_size=24):
                     pause_flag.set()
             if key in ('q', 'Q'):
                 stop_flag.set()
-            time.sleep(0.05)
 
     key_thread = threading.Thread(target=keyboard_listener, daemon=True)
     key_thread.start()
@@ -336,191 +1159,2264 @@ def play_ascii_video_stream(folder, audio, speed=24, wide=160, buffer_size=24):
             time.sleep(sleep_for)
         print('\x1b[H', end='')  # move cursor home
         # Batch terminal output: print whole frame at once
-        print(pic_from_ascii_txt(os.path.join(folder, frames[i])), end='')
+        print(pic_from_ascii_txt(os.path.join(folder, frames[i]), depth), end='')
         i += 1
     stop_flag.set()
     pygame.mixer.music.stop()
     key_thread.join()
+    keys.close()
     pygame.mixer.quit()
 
-# streams video/audio in parallel, starts playback after buffer fills
-def get_stuff_from_video_stream(vid, out, speed=24, buffer_size=24):
+# what's in the file? ffmpeg -i prints it to stderr, we fish it out
+def probe_video(vid, ffmpeg_bin=None):
+    ffmpeg_bin = ffmpeg_bin or os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+    res = subprocess.run([ffmpeg_bin, '-hide_banner', '-nostdin', '-i', vid],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    info = res.stderr.decode('utf-8', errors='replace')
+    video = re.search(r'Stream #.*?Video:.*?(\d{2,5})x(\d{2,5})', info)
+    if not video:
+        raise ValueError(f'no video stream in {vid}')
+    duration = re.search(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)', info)
+    fps = re.search(r'Stream #.*?Video:.*?(\d+(?:\.\d+)?) (?:fps|tbr)', info)
+    return {
+        'width': int(video.group(1)),
+        'height': int(video.group(2)),
+        'duration': int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3)) if duration else 0.0,
+        'fps': float(fps.group(1)) if fps else None,
+        'has_audio': re.search(r'Stream #.*?Audio:', info) is not None,
+    }
+
+# raw rgb24 frames straight out of an ffmpeg pipe, already scaled to the cell grid.
+# first_frame/frames: exactly frames [first_frame, first_frame + frames) of a decode from the start
+# (frames=None: to the end), so segments decoded separately stitch back together frame for frame
+class FFmpegDecoder:
+    def __init__(self, vid, size, fps, start_time=0.0, ffmpeg_bin=None, first_frame=None, frames=None, threads=None):
+        self.size = size  # (wide, tall)
+        self.frame_bytes = size[0] * size[1] * 3
+        cmd = [ffmpeg_bin or os.environ.get('FFMPEG_BINARY', 'ffmpeg'), '-v', 'error', '-nostdin']
+        if threads:
+            cmd += ['-threads', str(threads)]
+        vf = f'fps={fps},scale={size[0]}:{size[1]}:flags=area'
+        if first_frame is not None:
+            # a plain -ss restarts the fps= grid at the seek point, which can land a frame off.
+            # seek a second early, keep the real timestamps so fps= numbers frames like a decode
+            # from 0 does, then trim to the wanted frame number
+            start_time = max(0.0, first_frame / fps - 1.0)
+            vf = f'fps={fps},trim=start_pts={first_frame},scale={size[0]}:{size[1]}:flags=area'
+        if start_time > 0:
+            cmd += ['-ss', f'{start_time:.3f}']  # input seeking: jumps, doesn't decode its way there
+        if first_frame is not None:
+            cmd += ['-copyts', '-start_at_zero']
+        cmd += ['-i', vid, '-an', '-sn', '-vf', vf]
+        if frames is not None:
+            cmd += ['-frames:v', str(frames)]
+        cmd += ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    # fill a caller-owned (tall, wide, 3) uint8 buffer, False at end of video
+    def read_into(self, buf):
+        view = memoryview(buf).cast('B')
+        got = 0
+        while got < self.frame_bytes:
+            n = self.proc.stdout.readinto(view[got:])
+            if not n:
+                return False
+            got += n
+        return True
+
+    def read(self):
+        buf = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+        return buf if self.read_into(buf) else None
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.stdout.close()
+        self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+# audio decoded while it plays: pcm straight out of an ffmpeg pipe, a chunk at a time
+# into a mixer channel's queue, so nothing gets transcoded up front. seek = new ffmpeg.
+# also the playback clock: position() is where the listener actually is.
+# every Channel call happens on one mixer thread (SDL swaps queued sounds under us, and pygame
+# doesn't like two threads poking a channel while it does); everyone else just asks it to.
+# the channel is only touched from the first seek() on, so a playlist can make the next
+# video's stream (and prime() it) while the current one is still playing
+class AudioStream:
+    # mixer sample size -> ffmpeg's name for it. pygame's only 32-bit format is float, and 2.x
+    # reports it as -32 (older ones as 32)
+    PCM_FORMATS = {8: 'u8', -8: 's8', 16: 'u16le', -16: 's16le', 32: 'f32le', -32: 'f32le'}
+
+    def __init__(self, vid, volume=1.0, chunk_seconds=0.1, ffmpeg_bin=None, ahead=2):
+        import pygame  # sound go beep
+        self.pygame = pygame
+        self.vid = vid  # None = no audio track, the clock still runs
+        self.ffmpeg_bin = ffmpeg_bin or os.environ.get('FFMPEG_BINARY', 'ffmpeg')
+        self.rate, size, self.channels = pygame.mixer.get_init()
+        if size not in self.PCM_FORMATS:
+            raise ValueError(f'unsupported mixer sample size: {size}')
+        self.pcm_format = self.PCM_FORMATS[size]
+        self.frame_bytes = abs(size) // 8 * self.channels
+        self.chunk_bytes = max(1, int(self.rate * chunk_seconds)) * self.frame_bytes
+        self.ahead = ahead  # decoded chunks waiting for the channel, on top of the one queued in it
+        pygame.mixer.set_reserved(1)
+        self.channel = pygame.mixer.Channel(0)
+        self.volume = volume
+        self.active = False  # has the channel
+        self.closed = False
+        self.primed = None  # (position, ffmpeg, pcm chunks) from prime()
+        self.generation = 0
+        self.proc = None
+        self.lock = threading.Lock()
+        self.wake = threading.Condition(self.lock)
+        self.mixer = None  # the thread that makes every Channel call, from the first seek()
+        self.commands = collections.deque()  # ('stop'|'pause'|'unpause'|'volume', arg) for it, in order
+        self.pending = collections.deque()  # (sound, position, seconds) decoded, not handed over yet
+        self.fade_ms = 0
+        self.busy = False  # channel.get_busy(), as the mixer thread last saw it
+        self.start_pos = 0.0
+        self.seek_time = time.monotonic()
+        self.current = None  # (position, monotonic start, seconds) of the chunk playing now
+        self.queued = None  # (sound, position, seconds) waiting in the channel queue
+        self.paused_at = None  # monotonic time pause() was called
+        self.started = threading.Event()  # first chunk of this generation is playing
+        self.decoded = False  # ffmpeg ran out, everything is in `pending` or beyond
+        self.finished = False  # ... and all of it went to the channel
+
+    def _spawn(self, pos):
+        cmd = [self.ffmpeg_bin, '-v', 'error', '-nostdin']
+        if pos > 0:
+            cmd += ['-ss', f'{pos:.3f}']
+        cmd += ['-i', self.vid, '-vn', '-sn', '-f', self.pcm_format, '-ac', str(self.channels),
+                '-ar', str(self.rate), '-']
+        return subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def _kill(self):
+        if self.proc is not None:
+            if self.proc.poll() is None:
+                self.proc.kill()
+            self.proc.stdout.close()
+            self.proc.wait()
+            self.proc = None
+
+    def _command(self, *cmd):
+        self.commands.append(cmd)
+        self.wake.notify_all()
+
+    # queued chunk took over? it starts the moment the one before it ends, so that's
+    # worked out from the clock, not asked of the channel
+    def _track(self, now):
+        if self.queued is not None and self.current is not None and now >= self.current[1] + self.current[2]:
+            _, pos, secs = self.queued
+            self.current = (pos, self.current[1] + self.current[2], secs)
+            self.queued = None
+
+    # decode the first `seconds` from `pos` ahead of time, without playing anything.
+    # a later seek(pos) starts with those chunks and carries on with the same ffmpeg
+    def prime(self, pos=0.0, seconds=1.0):
+        if self.vid is None:
+            return
+        with self.lock:
+            if self.closed or self.active:
+                return
+            self._kill()
+            self.proc = proc = self._spawn(pos)
+        chunks = []
+        want = int(seconds * self.rate) * self.frame_bytes
+        while len(chunks) * self.chunk_bytes < want:
+            try:
+                data = proc.stdout.read(self.chunk_bytes)
+            except (OSError, ValueError):
+                return  # closed while priming
+            if not data:
+                break
+            chunks.append(data)
+        with self.lock:
+            if self.proc is proc:
+                self.primed = (pos, proc, chunks)
+
+    # start playing from `pos` seconds; a running decode is thrown away
+    def seek(self, pos, fade_ms=0):
+        with self.lock:
+            if self.closed:
+                return
+            self.generation += 1
+            generation = self.generation
+            if not self.active:
+                self.active = True
+                self._command('volume', self.volume)
+                self.mixer = threading.Thread(target=self._mix, daemon=True, name='mixer')
+                self.mixer.start()
+            self._command('stop')
+            self.pending.clear()
+            primed, self.primed = self.primed, None
+            chunks = None
+            if primed is not None and primed[0] == pos and primed[1] is self.proc:
+                chunks = primed[2]  # prime() already decoded the start
+            else:
+                self._kill()
+            self.start_pos = max(0.0, pos)
+            self.seek_time = time.monotonic()
+            self.fade_ms = fade_ms
+            self.current = self.queued = None
+            self.paused_at = None
+            self.decoded = self.finished = False
+            self.started.clear()
+            if self.vid is None:
+                self.current = (self.start_pos, time.monotonic(), float('inf'))
+                self.started.set()
+                return
+            if chunks is None:
+                self.proc = self._spawn(self.start_pos)
+            proc = self.proc
+        threading.Thread(target=self._read, args=(generation, proc, chunks or ()), daemon=True).start()
+
+    # reader thread: pcm -> Sound, never more than `ahead` of them waiting
+    def _read(self, generation, proc, chunks=()):
+        pos = self.start_pos
+        chunks = collections.deque(chunks)
+        while True:
+            try:
+                data = chunks.popleft() if chunks else proc.stdout.read(self.chunk_bytes)
+            except (OSError, ValueError):
+                return  # killed by a seek/close
+            data = data[:len(data) - len(data) % self.frame_bytes]
+            if not data:
+                break
+            sound = self.pygame.mixer.Sound(buffer=data)
+            secs = len(data) / self.frame_bytes / self.rate
+            with self.lock:
+                while self.generation == generation and len(self.pending) >= self.ahead:
+                    self.wake.wait(0.1)
+                if self.generation != generation:
+                    return
+                self.pending.append((sound, pos, secs))
+                self.wake.notify_all()
+            pos += secs
+        with self.lock:
+            if self.generation == generation:
+                self.decoded = True
+                self.wake.notify_all()
+
+    # mixer thread: runs what the others asked for, then keeps the channel fed
+    def _mix(self):
+        with self.lock:
+            while True:
+                while self.commands:
+                    cmd = self.commands.popleft()
+                    if cmd[0] == 'volume':
+                        self.channel.set_volume(cmd[1])
+                    else:
+                        getattr(self.channel, cmd[0])()  # stop / pause / unpause
+                if self.closed:
+                    return
+                self.busy = self.channel.get_busy()
+                while self._hand_over(time.monotonic()):
+                    pass
+                self.wake.wait(0.01)
+
+    # one decoded chunk into the channel, if there's room. False = nothing to do right now
+    def _hand_over(self, now):
+        self._track(now if self.paused_at is None else self.paused_at)  # paused = the clock stands still
+        if not self.pending:
+            if self.decoded and not self.finished:
+                self.finished = True
+                self.started.set()  # nothing to wait for
+            return False
+        sound, pos, secs = self.pending[0]
+        if self.paused_at is None and self.current is None:
+            self.channel.play(sound, fade_ms=self.fade_ms)
+            self.current = (pos, now, secs)
+            self.started.set()
+        elif self.paused_at is None and not self.busy:
+            self.channel.play(sound)  # ran dry (slow disk/cpu), pick up from here
+            self.current = (pos, now, secs)
+            self.queued = None
+        elif self.queued is None and self.channel.get_queue() is None:
+            self.channel.queue(sound)
+            self.queued = (sound, pos, secs)
+        else:
+            return False
+        self.busy = True
+        self.pending.popleft()
+        self.wake.notify_all()  # room for the reader
+        return True
+
+    def wait_started(self, timeout=None):
+        return self.started.wait(timeout)
+
+    # seconds into the track that are coming out of the speakers right now
+    def position(self):
+        with self.lock:
+            now = time.monotonic() if self.paused_at is None else self.paused_at
+            self._track(now)
+            if self.current is None:
+                if self.finished:  # nothing decoded at all, run on the wall clock
+                    return self.start_pos + max(0.0, now - self.seek_time)
+                return self.start_pos
+            pos, since, secs = self.current
+            if self.finished and self.queued is None and not self.busy:
+                secs = float('inf')  # track is shorter than the video, keep counting
+            return pos + min(max(0.0, now - since), secs)
+
+    def pause(self):
+        with self.lock:
+            if self.paused_at is None:
+                self.paused_at = time.monotonic()
+                if self.active:
+                    self._command('pause')
+
+    def resume(self):
+        with self.lock:
+            if self.paused_at is not None:
+                if self.current is not None:
+                    pos, since, secs = self.current
+                    self.current = (pos, since + time.monotonic() - self.paused_at, secs)
+                self.paused_at = None
+                if self.active:
+                    self._command('unpause')
+
+    def set_volume(self, volume):
+        with self.lock:
+            if volume != self.volume:
+                self.volume = volume
+                if self.active:
+                    self._command('volume', volume)
+
+    # decoder hit the end and the last chunk has played out
+    def done(self):
+        with self.lock:
+            return self.finished and not self.busy
+
+    # waits for the mixer thread to stop the channel, so whatever plays on it next is safe
+    def close(self):
+        with self.lock:
+            self.generation += 1
+            self.closed = True
+            self.primed = None
+            self.pending.clear()
+            if self.active:
+                self._command('stop')  # a stream that never played mustn't stop the one that is
+            self._kill()
+        if self.mixer is not None and self.mixer is not threading.current_thread():
+            self.mixer.join()
+
+# audio is the master clock: a frame waits until the audio reaches it, and once the
+# audio is more than `drop_after` seconds ahead, frames get skipped (not even converted)
+class AVSync:
+    def __init__(self, clock, fps, drop_after=0.1):
+        self.clock = clock  # () -> seconds into the video the listener is at
+        self.delay = 1.0 / fps
+        self.drop_after = drop_after  # 0 = never drop, just show everything late
+        self.shown = 0
+        self.dropped = 0
+        self.late = 0  # shown, but more than half a frame after their time
+        self.drift = 0.0  # audio minus video at the last shown frame, + = video behind
+        self.max_drift = 0.0
+        self.drift_total = 0.0
+
+    # sleep (time.sleep is monotonic) until the audio reaches frame i. False = still
+    # not there after max_wait (audio stalled/paused), or sleep() returned True because
+    # something woke it early, so the caller can look at input
+    def wait(self, i, max_wait=0.25, sleep=time.sleep):
+        ahead = i * self.delay - self.clock()
+        if ahead > 0 and sleep(min(ahead, max_wait)):
+            return False
+        return ahead <= max_wait
+
+    # how many frames from i on are already stale and should be skipped
+    def behind(self, i):
+        if self.drop_after <= 0:
+            return 0
+        lag = self.clock() - i * self.delay
+        return int(lag / self.delay) if lag > self.drop_after else 0
+
+    def show(self, i):
+        drift = self.clock() - i * self.delay
+        self.shown += 1
+        self.drift = drift
+        self.drift_total += abs(drift)
+        self.max_drift = max(self.max_drift, abs(drift))
+        if drift > self.delay / 2:
+            self.late += 1
+
+    def stats(self):
+        return {
+            'shown': self.shown,
+            'dropped': self.dropped,
+            'late': self.late,
+            'drift_ms': self.drift * 1000,
+            'mean_abs_drift_ms': self.drift_total / self.shown * 1000 if self.shown else 0.0,
+            'max_abs_drift_ms': self.max_drift * 1000,
+        }
+
+# what the player draws at: color depth, fraction of the width, and every `stride`-th frame
+QualityLevel = collections.namedtuple('QualityLevel', ['depth', 'scale', 'stride'])
+
+# steps quality down when drawing a frame (convert + terminal write) keeps eating most of its
+# time slot, and back up once it's been cheap for a while. color depth goes first, then the
+# width, then how many frames get drawn at all. a step up that has to be undone right away
+# doubles the wait before the next try, so it doesn't flap between two levels
+class QualityController:
+    DOWN = 0.85  # average cost above this share of the budget -> step down
+    UP = 0.4  # below this -> step up
+    SCALES = (0.75, 0.5)
+    STRIDES = (2, 3)
+
+    def __init__(self, fps, depth, can_resize=True, down_after=0.5, up_after=3.0):
+        self.delay = 1.0 / fps
+        self.down_after = down_after  # seconds spent over budget in a row
+        self.up_after = self.up_base = up_after  # seconds of playback well under it in a row
+        self.max_up_after = up_after * 16
+        self.configure(depth, can_resize)
+        self.changes = 0
+
+    # new ladder (options.json changed the depth, or the source can't change width): back to the top
+    def configure(self, depth, can_resize):
+        self.key = (depth, can_resize)
+        depths = COLOR_DEPTHS[COLOR_DEPTHS.index(depth):-1] or (depth,)  # mono only if asked for
+        levels = [QualityLevel(d, 1.0, 1) for d in depths]
+        if can_resize:
+            levels += [QualityLevel(depths[-1], scale, 1) for scale in self.SCALES]
+        self.levels = levels + [QualityLevel(*levels[-1][:2], stride) for stride in self.STRIDES]
+        self.level = 0
+        self.last_step = 0
+        self._restart()
+
+    def _restart(self):
+        self.avg = None
+        self.over = self.under = 0
+
+    @property
+    def current(self):
+        return self.levels[self.level]
+
+    # seconds a drawn frame cost. True = the level changed
+    def add(self, cost):
+        budget = self.delay * self.current.stride
+        self.avg = cost if self.avg is None else self.avg * 0.9 + cost * 0.1
+        # counted in seconds, not frames: on a really slow terminal one frame can take a second
+        self.over = self.over + cost if self.avg > budget * self.DOWN else 0
+        self.under = self.under + budget if self.avg < budget * self.UP else 0
+        if self.over >= self.down_after and self.level < len(self.levels) - 1:
+            if self.last_step < 0:
+                self.up_after = min(self.up_after * 2, self.max_up_after)  # that step up didn't hold
+            return self._step(1)
+        if self.under >= self.up_after and self.level > 0:
+            return self._step(-1)
+        if self.under >= self.up_base * 4:
+            self.up_after = self.up_base  # been fine for a long while, try again sooner next time
+        return False
+
+    def _step(self, direction):
+        self.level += direction
+        self.last_step = direction
+        self.changes += 1
+        self._restart()
+        return True
+
+    # frames to leave out before i so the drawn ones land on the stride
+    def thin(self, i):
+        stride = self.current.stride
+        return (stride - i % stride) % stride
+
+    def label(self):
+        depth, scale, stride = self.current
+        text = f" Q{self.level}"
+        if self.level:
+            text += f" {depth}"
+            if scale < 1:
+                text += f" {int(scale * 100)}%"
+            if stride > 1:
+                text += f" 1/{stride}"
+        return text
+
+    def stats(self):
+        return {'quality_level': self.level, 'quality_changes': self.changes}
+
+# how long each pipeline stage took over the last `window` frames, for the HUD. can also
+# stream every span to a chrome://tracing / Perfetto JSON file (flat memory, written as it goes)
+class StageTimes:
+    STAGES = ('extract', 'convert', 'print', 'sleep')
+    HUD_LABELS = {'extract': 'dec', 'convert': 'cnv', 'print': 'out', 'sleep': 'slp'}  # has to fit 80 cols
+
+    def __init__(self, window=120):
+        self.spans = {stage: collections.deque(maxlen=window) for stage in self.STAGES}
+        self.shown = collections.deque(maxlen=window)  # perf_counter() as each frame went out
+        self.sizes = collections.deque(maxlen=window)  # bytes written for it
+        self.trace = None  # TraceFile the spans also go to
+
+    def start_trace(self, trace):
+        self.trace = trace
+
+    # stage ran from `start` (a perf_counter()) until now
+    def add(self, stage, start, frame=None):
+        end = time.perf_counter()
+        self.spans[stage].append(end - start)
+        trace = self.trace
+        if trace is not None:
+            trace.event({'name': stage, 'ph': 'X', 'ts': trace.us(start), 'dur': round((end - start) * 1e6, 1),
+                         'args': {'frame': frame}})
+        return end
+
+    # something worth a tick mark in the trace (dropped frame, seek)
+    def mark(self, name, frame=None):
+        trace = self.trace
+        if trace is not None:
+            trace.event({'name': name, 'ph': 'i', 's': 't', 'ts': trace.us(time.perf_counter()),
+                         'args': {'frame': frame}})
+
+    def frame_out(self, nbytes):
+        self.shown.append(time.perf_counter())
+        self.sizes.append(nbytes)
+
+    def percentile(self, stage, p):
+        spans = sorted(self.spans[stage])
+        return spans[min(len(spans) - 1, int(len(spans) * p))] if spans else 0.0
+
+    def fps(self):
+        if len(self.shown) < 2:
+            return 0.0
+        return (len(self.shown) - 1) / max(1e-9, self.shown[-1] - self.shown[0])
+
+    # "dec 0.4/2.1 cnv ..." = p50/p95 ms per stage, then queue depth, fps, bytes/frame
+    def hud(self, queued=None):
+        line = ' '.join(f"{self.HUD_LABELS[stage]} {self.percentile(stage, 0.5) * 1000:.1f}/"
+                        f"{self.percentile(stage, 0.95) * 1000:.1f}" for stage in self.STAGES)
+        if queued is not None:
+            line += f" q {queued[0]}/{queued[1]}"
+        size = sum(self.sizes) / len(self.sizes) if self.sizes else 0
+        return line + f" {self.fps():.1f}fps {size / 1024:.1f}K/f"
+
+    def close(self):
+        self.trace = None  # the file belongs to the PlayerSession
+
+# chrome://tracing / perfetto json, one per PlayerSession: a playlist's videos all end up in
+# the same timeline instead of each one truncating the file
+class TraceFile:
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'w', encoding='utf-8')
+        self.f.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+        self.first = True
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.named = set()  # threads that already got a thread_name event
+        self.lock = threading.Lock()  # extractor threads record too
+
+    def us(self, t):
+        return round((t - self.origin) * 1e6, 1)
+
+    def event(self, event):
+        tid = threading.get_ident()
+        with self.lock:
+            if self.f is None:
+                return
+            if tid not in self.named:
+                self.named.add(tid)
+                self._write({'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+                             'args': {'name': threading.current_thread().name}})
+            event.update(pid=self.pid, tid=tid)
+            self._write(event)
+
+    def _write(self, event):
+        self.f.write(('' if self.first else ',\n') + json.dumps(event))
+        self.first = False
+
+    def close(self):
+        with self.lock:
+            if self.f is not None:
+                self.f.write('\n]}\n')
+                self.f.close()
+                self.f = None
+
+# fixed set of reusable frame slots between one producer (extractor) and one
+# consumer (player). full ring = producer waits, nothing gets dropped.
+class FrameRing:
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.slots = [None] * self.capacity
+        self.indices = [0] * self.capacity
+        self.head = 0  # oldest unread slot
+        self.count = 0  # filled slots, including the one the player holds
+        self.holding = False  # player is still drawing slots[head]
+        self.generation = 0  # bumped on every seek, stale writes get thrown away
+        self.start_index = 0
+        self.eof = False
+        self.closed = False
+        self.put_stalls = 0  # producer found the ring full
+        self.get_stalls = 0  # consumer found the ring empty
+        self.high_water = 0
+        self.got_generation = 0  # generation the last get() answered for
+        self.cache_writer = None  # set when this run should also fill the VideoCache
+        self.timings = None  # StageTimes the extractor reports to
+        self.scale = 1.0  # share of the playback width to decode at (QualityController)
+        self.cond = threading.Condition()
+
+    # producer: wait for a free slot, hand back (slot number, array) or None if seek/close
+    def acquire(self, generation, shape):
+        with self.cond:
+            if self.count >= self.capacity:
+                self.put_stalls += 1
+            while self.count >= self.capacity and self.generation == generation and not self.closed:
+                self.cond.wait()
+            if self.generation != generation or self.closed:
+                return None
+            slot_no = (self.head + self.count) % self.capacity
+            slot = self.slots[slot_no]
+            if slot is None or slot.shape != tuple(shape):
+                slot = self.slots[slot_no] = np.empty(shape, dtype=np.uint8)
+            return slot_no, slot
+
+    # producer: slot is filled, publish it
+    def commit(self, generation, slot_no, index):
+        with self.cond:
+            if self.generation != generation or self.closed:
+                return False
+            self.indices[slot_no] = index
+            self.count += 1
+            self.high_water = max(self.high_water, self.count)
+            self.cond.notify_all()
+            return True
+
+    def put(self, generation, index, frame):
+        got = self.acquire(generation, frame.shape)
+        if got is None:
+            return False
+        slot_no, slot = got
+        np.copyto(slot, frame, casting='unsafe')
+        return self.commit(generation, slot_no, index)
+
+    # producer: no more frames for this generation
+    def finish(self, generation):
+        with self.cond:
+            if self.generation == generation:
+                self.eof = True
+                self.cond.notify_all()
+
+    # producer: sleep until the player seeks (new generation) or quits (None)
+    def next_generation(self, generation):
+        with self.cond:
+            while self.generation == generation and not self.closed:
+                self.cond.wait()
+            if self.closed:
+                return None, None
+            return self.generation, self.start_index
+
+    def _release(self):
+        if self.holding:
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            self.holding = False
+            self.cond.notify_all()
+
+    # consumer: next (index, frame), None at end. frame stays valid until the next get()
+    def get(self, timeout=None):
+        with self.cond:
+            self._release()
+            if self.count == 0 and not self.eof and not self.closed:
+                self.get_stalls += 1
+                if not self.cond.wait_for(lambda: self.count or self.eof or self.closed, timeout):
+                    raise queue.Empty
+            self.got_generation = self.generation
+            if self.count == 0:
+                return None
+            self.holding = True
+            return self.indices[self.head], self.slots[self.head]
+
+    # (frames waiting, room for), for the HUD
+    def queued(self):
+        return self.count, self.capacity
+
+    # consumer: block until n frames are buffered (or the video ends)
+    def wait_filled(self, n, timeout=None):
+        n = min(n, self.capacity)
+        with self.cond:
+            return self.cond.wait_for(lambda: self.count >= n or self.eof or self.closed, timeout)
+
+    # consumer: drop everything, producer restarts at start_index
+    def reset(self, start_index):
+        with self.cond:
+            self.generation += 1
+            self.start_index = start_index
+            self.head = 0
+            self.count = 0
+            self.holding = False
+            self.eof = False
+            self.cond.notify_all()
+            return self.generation
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {
+                'occupancy': self.count,
+                'capacity': self.capacity,
+                'high_water': self.high_water,
+                'put_stalls': self.put_stalls,
+                'get_stalls': self.get_stalls,
+            }
+
+# the last few frames that were drawn (as cells), so a short seek back
+# plays from memory while the decoder restarts further on
+class FrameHistory:
+    def __init__(self, capacity):
+        self.capacity = max(0, int(capacity))
+        self.frames = collections.deque()  # (glyphs, colors, chars), oldest first
+        self.first = 0  # index of frames[0]
+
+    @property
+    def end(self):
+        return self.first + len(self.frames)
+
+    def clear(self):
+        self.frames.clear()
+
+    # keeps a contiguous run of indices; a frame that isn't the next one starts over
+    def add(self, index, glyphs, colors, chars):
+        if not self.capacity or self.first <= index < self.end:
+            return  # off, or replaying what we already hold
+        if index != self.end:
+            self.frames.clear()
+        if not self.frames:
+            self.first = index
+        reuse = None
+        if len(self.frames) == self.capacity:
+            reuse = self.frames.popleft()
+            self.first += 1
+        if reuse is not None and reuse[0].shape == glyphs.shape:
+            np.copyto(reuse[0], glyphs)
+            np.copyto(reuse[1], colors)
+            self.frames.append((reuse[0], reuse[1], chars))
+        else:
+            self.frames.append((glyphs.copy(), colors.copy(), chars))
+
+    # (index, (glyphs, colors, chars)) from `index` up to the newest frame, None if it's not held
+    def since(self, index):
+        if not self.first <= index < self.end:
+            return None
+        return collections.deque((self.first + k, self.frames[k]) for k in range(index - self.first, len(self.frames)))
+
+# a frame the render workers already converted, copied out of its shared block
+RenderedFrame = collections.namedtuple('RenderedFrame', ['rgb', 'glyphs', 'colors', 'settings', 'depth', 'ansi'])
+
+_MAX_CELL_BYTES = 23  # '\033[38;2;255;255;255m' + a 4-byte glyph
+
+# shared block layout: rgb in | glyphs | colors | full-frame ansi out.
+# half blocks fit too: per 2 pixels 13 bytes of cells + 41 of ansi, under 2 * 30
+def _slot_size(shape):
+    tall, wide = shape[:2]
+    return tall * wide * (7 + _MAX_CELL_BYTES) + tall + len(_HALF_RESET_BYTES)
+
+def _slot_views(buf, shape, chars):
+    rows, wide = shape[:2]
+    tall = rows // 2 if half_block(chars) else rows
+    n = rows * wide * 3
+    rgb = np.ndarray((rows, wide, 3), dtype=np.uint8, buffer=buf)
+    glyphs = np.ndarray((tall, wide), dtype=np.uint8, buffer=buf, offset=n)
+    colors = np.ndarray((tall, wide, cell_channels(chars)), dtype=np.uint8, buffer=buf, offset=n + tall * wide)
+    return rgb, glyphs, colors, n + tall * wide * (1 + cell_channels(chars))
+
+def _drop_shared(shm):
+    shm.close()
+    with contextlib.suppress(FileNotFoundError):
+        shm.unlink()
+
+# workers inherit the player's signal handlers; those would wipe the temp folder on pool.terminate()
+def _render_worker_init():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+def _render_into(buf, shape, settings, depth):
+    rgb, glyphs, colors, ansi_at = _slot_views(buf, shape, settings.chars)
+    glyphs[...], colors[...] = grid_frame_to_cells(rgb, settings)
+    ansi = cells_to_bytes(glyphs, colors, settings.chars, depth)
+    buf[ansi_at:ansi_at + len(ansi)] = ansi
+    return len(ansi)
+
+# runs in a worker: convert the frame sitting in block `name`, returns the ansi length
+def _render_slot(name, shape, chars, gamma, contrast, depth):
+    from multiprocessing import shared_memory  # frames between processes, no pickling
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return _render_into(shm.buf, shape, render_settings(chars, gamma, contrast), depth)
+    finally:
+        shm.close()
+
+# render stage between the decoder's FrameRing and the player: keeps `ahead` frames
+# converting in worker processes so a slow frame never lands on the playback thread.
+# quacks like a FrameRing; settings/depth are callables read as each frame goes out
+class RenderAhead:
+    def __init__(self, source, workers, ahead, settings, depth, pool=None):
+        self.source = source
+        self.workers = max(1, int(workers))
+        self.ahead = max(1, int(ahead))
+        self.settings = settings
+        self.depth = depth
+        self.cache_writer = source.cache_writer
+        self.timings = source.timings
+        self.own_pool = pool is None  # a playlist shares one pool between its videos
+        self.pool = pool or render_pool(self.workers)
+        if self.pool is None:
+            raise OSError('render workers would not start')
+        self.blocks = set()  # every shared block we made, so close() gets them all
+        self.free = []  # shared blocks nobody is using
+        self.pending = collections.deque()  # (index, shm, shape, settings, depth, result), playback order
+        self.draining = []  # (shm, result) cancelled by a seek, reusable once the worker lets go
+        self.source_generation = source.generation
+        self.eof = False
+        self.closed = False
+        self.high_water = 0
+        self.get_stalls = 0
+        self.cond = threading.Condition()
+        atexit.register(self.close)  # killed mid-video: still stop the workers and free the blocks
+        threading.Thread(target=self._feed, daemon=True).start()
+
+    def _done(self, _):
+        with self.cond:
+            self.cond.notify_all()
+
+    def _reclaim(self):
+        busy = []
+        for shm, result in self.draining:
+            if result.ready():
+                self.free.append(shm)
+            else:
+                busy.append((shm, result))
+        self.draining = busy
+
+    def _block(self, shape):
+        self._reclaim()
+        size = _slot_size(shape)
+        while self.free:
+            shm = self.free.pop()
+            if shm.size >= size:
+                return shm
+            self.blocks.discard(shm)
+            _drop_shared(shm)  # too small since a resize
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        self.blocks.add(shm)
+        return shm
+
+    # feeder thread: decoded frame -> shared block -> worker, never more than `ahead` out
+    def _feed(self):
+        while True:
+            with self.cond:
+                while not self.closed and (self.eof or len(self.pending) >= self.ahead):
+                    self.cond.wait(0.1)
+                if self.closed:
+                    return
+            try:
+                got = self.source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            with self.cond:
+                if self.closed:
+                    return
+                if self.source.got_generation != self.source_generation:
+                    continue  # from before a seek
+                if got is None:
+                    self.eof = True
+                    self.cond.notify_all()
+                    continue
+                index, frame = got
+                shm = self._block(frame.shape)
+                settings, depth = self.settings(), self.depth()
+                np.copyto(_slot_views(shm.buf, frame.shape, settings.chars)[0], frame)
+                result = self.pool.apply_async(
+                    _render_slot, (shm.name, frame.shape, settings.chars, settings.gamma, settings.contrast, depth),
+                    callback=self._done, error_callback=self._done)
+                self.pending.append((index, shm, frame.shape, settings, depth, result))
+                self.high_water = max(self.high_water, len(self.pending))
+
+    # consumer: next (index, RenderedFrame), None at end
+    def get(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            if not (self.pending and self.pending[0][-1].ready()) and not self.eof:
+                self.get_stalls += 1
+            while not (self.pending and self.pending[0][-1].ready()):
+                if self.closed or (self.eof and not self.pending):
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self.cond.wait(remaining)
+            index, shm, shape, settings, depth, result = self.pending.popleft()
+            self.cond.notify_all()
+        try:
+            n = result.get()  # re-raises whatever went wrong in the worker
+            frame = self._copy_out(shm.buf, shape, settings, depth, n)
+        finally:
+            with self.cond:
+                self.free.append(shm)
+        return index, frame
+
+    # a few hundred KB of memcpy, so no view into a block outlives the block
+    def _copy_out(self, buf, shape, settings, depth, n):
+        rgb, glyphs, colors, ansi_at = _slot_views(buf, shape, settings.chars)
+        return RenderedFrame(rgb.copy(), glyphs.copy(), colors.copy(), settings, depth,
+                             bytes(buf[ansi_at:ansi_at + n]))
+
+    def queued(self):
+        return len(self.pending), self.ahead
+
+    def wait_filled(self, n, timeout=None):
+        n = min(n, self.ahead)
+        def filled():
+            head = list(self.pending)[:n]
+            return self.closed or self.eof or (len(head) >= n and all(p[-1].ready() for p in head))
+        with self.cond:
+            return self.cond.wait_for(filled, timeout)
+
+    # seek: frames in flight are dropped (their blocks come back when the worker finishes)
+    def reset(self, start_index):
+        with self.cond:
+            self.draining.extend((p[1], p[-1]) for p in self.pending)
+            self.pending.clear()
+            self.eof = False
+            self.source_generation = self.source.reset(start_index)
+            self.cond.notify_all()
+            return self.source_generation
+
+    def close(self):
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        atexit.unregister(self.close)
+        self.source.close()
+        if self.own_pool:
+            self.pool.terminate()
+        with self.cond:
+            for shm in self.blocks:
+                _drop_shared(shm)
+            self.blocks.clear()
+            self.free, self.draining = [], []
+            self.pending.clear()
+
+    def stats(self):
+        stats = self.source.stats()
+        with self.cond:
+            stats.update({'rendered_ahead': len(self.pending), 'render_capacity': self.ahead,
+                          'render_high_water': self.high_water, 'render_stalls': self.get_stalls,
+                          'workers': self.workers})
+        return stats
+
+# None if the processes won't start (locked-down box, odd platform): callers convert on the
+# playback thread instead, same as render_workers=0
+def render_pool(workers):
+    import multiprocessing  # more chaos
+    try:
+        if os.name == 'posix':  # windows has no tracker process to share (and can't spawn one this way)
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()  # workers must share it, or each one "cleans up" our blocks
+        return multiprocessing.Pool(workers, initializer=_render_worker_init)
+    except (OSError, ImportError, NotImplementedError):
+        return None
+
+# sampled sha1: size + head/middle/tail, hashing a whole 2h file would cost more than it saves
+def video_fingerprint(path, sample=1 << 20):
+    size = os.path.getsize(path)
+    h = hashlib.sha1(str(size).encode('ascii'))
+    with open(path, 'rb') as f:
+        for pos in (0, max(0, size // 2 - sample // 2), max(0, size - sample)):
+            f.seek(pos)
+            h.update(f.read(sample))
+    return h.hexdigest()
+
+# converted video on disk: header json, then per frame glyph indices (1 byte/cell)
+# + final rgb (3 bytes/cell), then a uint64 frame-offset index and a trailer
+CACHE_MAGIC = b'VMCACHE1'
+CACHE_END = b'VMCEND01'
+CACHE_TRAILER = struct.Struct('<QQ8s')  # index offset, frame count, end magic
+
+# appends frames in order; anything out of order (seek, resize, option change) aborts it.
+# resume=True picks up a .part left by an interrupted run with the same header
+class FrameCacheWriter:
+    def __init__(self, cache, path, header, resume=False):
+        self.cache = cache
+        self.path = path
+        self.part = path + '.part'
+        self.header = header
+        self.shape = (header['tall'], header['wide'])
+        self.render_key = (header['chars'], header['gamma'], header['contrast'])
+        self.frame_bytes = self.shape[0] * self.shape[1] * (1 + cell_channels(header['chars']))
+        self.offsets = []
+        start, done = self._resumable() if resume else (0, 0)
+        if done:
+            self.f = open(self.part, 'r+b')
+            self.f.truncate(start + done * self.frame_bytes)  # a half-written last frame goes
+            self.f.seek(0, os.SEEK_END)
+            self.offsets = [start + k * self.frame_bytes for k in range(done)]
+        else:
+            self.f = open(self.part, 'wb')
+            head = json.dumps(header).encode('utf-8')
+            self.f.write(CACHE_MAGIC + struct.pack('<Q', len(head)) + head)
+
+    # (where frames start, whole frames already in the .part), (0, 0) if it's no good
+    def _resumable(self):
+        try:
+            with open(self.part, 'rb') as f:
+                if f.read(8) != CACHE_MAGIC:
+                    return 0, 0
+                head_len, = struct.unpack('<Q', f.read(8))
+                old = json.loads(f.read(head_len).decode('utf-8'))
+        except (OSError, ValueError, struct.error):
+            return 0, 0
+        if {k: v for k, v in old.items() if k != 'created'} != {k: v for k, v in self.header.items() if k != 'created'}:
+            return 0, 0
+        start = 16 + head_len
+        return start, (os.path.getsize(self.part) - start) // self.frame_bytes
+
+    @property
+    def frames(self):
+        return len(self.offsets)
+
+    # False = frame doesn't continue the recording, caller should abort()
+    def add(self, index, glyphs, colors, settings):
+        if self.f is None or index != len(self.offsets) or glyphs.shape != self.shape \
+                or (settings.chars, settings.gamma, settings.contrast) != self.render_key:
+            return False
+        self.offsets.append(self.f.tell())
+        self.f.write(glyphs.tobytes())
+        self.f.write(colors.tobytes())
+        return True
+
+    # None if the .part went missing (purged/evicted meanwhile), the entry is just not kept
+    def finish(self):
+        if self.f is None:
+            return None
+        try:
+            index_offset = self.f.tell()
+            self.f.write(np.asarray(self.offsets, dtype=np.uint64).tobytes())
+            self.f.write(CACHE_TRAILER.pack(index_offset, len(self.offsets), CACHE_END))
+            self.f.close()
+            self.f = None
+            os.replace(self.part, self.path)
+        except OSError:
+            self.abort()
+            return None
+        finally:
+            self.cache.release(self.path)
+        self.cache.evict()
+        return self.path
+
+    def abort(self):
+        if self.f is not None:
+            with contextlib.suppress(OSError):
+                self.f.close()
+            self.f = None
+            with contextlib.suppress(OSError):
+                os.remove(self.part)
+        self.cache.release(self.path)
+
+    # stop but keep the .part, a later resume=True writer carries on from here
+    def suspend(self):
+        if self.f is not None:
+            with contextlib.suppress(OSError):
+                self.f.close()
+            self.f = None
+        self.cache.release(self.path)
+
+# the player's side of a FrameCacheWriter: every frame taken off the frame source goes in, drawn
+# or skipped, and the writing happens on a thread of its own. frames skipped before they were
+# converted are converted there too, off the playback thread. falling more than `backlog`
+# frames behind (machine too busy) or a frame out of order drops the recording
+class CacheRecorder:
+    def __init__(self, writer, backlog=None):
+        self.writer = writer
+        self.backlog = backlog or 10 * writer.header['fps']
+        self.queue = queue.Queue()
+        self.failed = False
+        self.thread = threading.Thread(target=self._run, daemon=True, name='cache-recorder')
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.failed:
+                continue
+            index, glyphs, colors, settings = item
+            if colors is None:
+                glyphs, colors = grid_frame_to_cells(glyphs, settings)
+            if not self.writer.add(index, glyphs, colors, settings):
+                self.failed = True
+
+    def _put(self, item):
+        if not self.failed and self.queue.qsize() >= self.backlog:
+            self.failed = True
+        if not self.failed:
+            self.queue.put(item)
+        return not self.failed
+
+    # a frame the player has cells for. False = recording's off
+    def add(self, index, glyphs, colors, settings):
+        return self._put((index, glyphs, colors, settings))
+
+    # a decoded frame nobody converted (dropped/thinned). copied, the ring reuses its slot
+    def add_frame(self, index, rgb, settings):
+        return self._put((index, rgb.copy(), None, settings)) if not self.failed else False
+
+    def _stop(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+    # end of the video: waits for what's still queued, keeps the entry if all of it went in
+    def finish(self):
+        self._stop()
+        if self.failed:
+            self.writer.abort()
+            return None
+        return self.writer.finish()
+
+    def abort(self):
+        self.failed = True
+        self._stop()
+        self.writer.abort()
+
+# a cache entry, memory-mapped; frames come back as zero-copy views.
+# also quacks like a FrameRing so the player can use it as its frame source.
+class CachedFrames:
+    def __init__(self, path):
+        self.path = path
+        self.mm = None
+        self.offsets = None
+        self.closed = False
+        self.file = open(path, 'rb')
+        try:
+            self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.mm[:8] != CACHE_MAGIC:
+                raise ValueError(f'not a vidminal cache file: {path}')
+            head_len, = struct.unpack_from('<Q', self.mm, 8)
+            self.header = json.loads(self.mm[16:16 + head_len].decode('utf-8'))
+            index_offset, self.count, end = CACHE_TRAILER.unpack_from(self.mm, len(self.mm) - CACHE_TRAILER.size)
+            if end != CACHE_END:
+                raise ValueError(f'truncated vidminal cache file: {path}')
+            self.offsets = np.frombuffer(self.mm, dtype=np.uint64, count=self.count, offset=index_offset)
+        except BaseException:
+            self.close()
+            raise
+        self.wide = self.header['wide']
+        self.tall = self.header['tall']
+        self.chars = self.header['chars']
+        self.fps = self.header['fps']
+        self.scale = 1.0  # stored at one size, the QualityController never narrows it
+        self.next_index = 0
+
+    def frame(self, i):
+        n = self.wide * self.tall
+        off = int(self.offsets[i])
+        glyphs = np.frombuffer(self.mm, dtype=np.uint8, count=n, offset=off).reshape(self.tall, self.wide)
+        channels = cell_channels(self.chars)
+        colors = np.frombuffer(self.mm, dtype=np.uint8, count=n * channels,
+                               offset=off + n).reshape(self.tall, self.wide, channels)
+        return glyphs, colors
+
+    def get(self, timeout=None):
+        if self.closed or self.next_index >= self.count:
+            return None
+        i = self.next_index
+        self.next_index += 1
+        return i, self.frame(i)
+
+    def reset(self, start_index):
+        self.next_index = max(0, min(start_index, self.count))
+
+    def queued(self):
+        return self.count - self.next_index, self.count  # all of it is ready
+
+    def wait_filled(self, n, timeout=None):
+        return True
+
+    # unmaps and closes the file. a frame view still held somewhere keeps the map alive
+    # until it's dropped, but nothing is left open after that
+    def close(self):
+        self.closed = True
+        self.offsets = None
+        if self.mm is not None:
+            with contextlib.suppress(BufferError):
+                self.mm.close()
+            self.mm = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def stats(self):
+        return {'occupancy': self.count - self.next_index, 'capacity': self.count,
+                'high_water': self.count, 'put_stalls': 0, 'get_stalls': 0}
+
+# per-user folder of converted videos, size-capped, least recently used goes first
+# max_bytes=None: never evict (batch output folders)
+class VideoCache:
+    claimed = set()  # paths with a writer open, in this process (any VideoCache on the same folder)
+    claim_lock = threading.Lock()
+
+    def __init__(self, root=None, max_bytes=2048 << 20):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    @classmethod
+    def from_options(cls, opts):
+        return cls(opts['cache_dir'] or None, opts['cache_max_mb'] << 20)
+
+    # same video + same look = same entry
+    def entry_name(self, fingerprint, size, fps, settings):
+        key = json.dumps([size, fps, settings.chars, settings.gamma, settings.contrast])
+        return f'{fingerprint[:16]}-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]}.vmc'
+
+    def _touch(self, path):
+        with contextlib.suppress(OSError):
+            os.utime(path)
+
+    def open(self, name):
+        path = os.path.join(self.root, name)
+        if not os.path.exists(path):
+            return None
+        try:
+            frames = CachedFrames(path)
+        except (OSError, ValueError, struct.error):
+            with contextlib.suppress(OSError):
+                os.remove(path)  # broken entry, get rid of it
+            return None
+        self._touch(path)
+        return frames
+
+    # None if this entry is being written already (same video twice in a playlist): two
+    # writers on one .part would rename it out from under each other
+    def writer(self, name, header, resume=False):
+        path = os.path.join(self.root, name)
+        with self.claim_lock:
+            if path in self.claimed:
+                return None
+            self.claimed.add(path)
+        try:
+            return FrameCacheWriter(self, path, header, resume)
+        except BaseException:
+            self.release(path)
+            raise
+
+    def release(self, path):
+        with self.claim_lock:
+            self.claimed.discard(path)
+
+    def entries(self):
+        out = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            out.append({'name': name, 'path': path, 'size': st.st_size, 'last_used': st.st_mtime})
+        return sorted(out, key=lambda e: e['last_used'])
+
+    # drop least recently used entries until we're under the cap (stale .part files too)
+    def evict(self):
+        if self.max_bytes is None:
+            return
+        entries = self.entries()
+        now = time.time()
+        for e in entries:
+            if e['name'].endswith('.part') and now - e['last_used'] > 3600:
+                with contextlib.suppress(OSError):
+                    os.remove(e['path'])
+        entries = [e for e in entries if not e['name'].endswith('.part')]
+        total = sum(e['size'] for e in entries)
+        for e in entries:
+            if total <= self.max_bytes:
+                break
+            with contextlib.suppress(OSError):
+                os.remove(e['path'])
+                total -= e['size']
+
+    def purge(self, prefix=''):
+        removed = 0
+        for e in self.entries():
+            if e['name'].startswith(prefix):
+                with contextlib.suppress(OSError):
+                    os.remove(e['path'])
+                    removed += 1
+        return removed
+
+# where caches live: XDG on linux, Library/Caches on mac, LOCALAPPDATA on windows
+def default_cache_dir():
+    sysname = platform.system()
+    if sysname == 'Windows':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    elif sysname == 'Darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'vidminal')
+
+# vidminal.py --cache list | --cache purge [name prefix]
+def cache_cli(args, opts):
+    cache = VideoCache.from_options(opts)
+    cmd = args[0] if args else 'list'
+    if cmd == 'list':
+        entries = cache.entries()
+        for e in entries:
+            detail = ''
+            if e['name'].endswith('.vmc'):
+                try:
+                    with CachedFrames(e['path']) as cf:
+                        h = cf.header
+                        detail = f"{h['wide']}x{h['tall']} @{h['fps']}fps {cf.count} frames  {os.path.basename(h.get('source', ''))}"
+                except (OSError, ValueError, struct.error):
+                    detail = '(broken)'
+            used = time.strftime('%Y-%m-%d %H:%M', time.localtime(e['last_used']))
+            print(f"{e['name']:<34} {e['size'] / (1 << 20):9.1f} MiB  {used}  {detail}")
+        total = sum(e['size'] for e in entries)
+        print(f'{len(entries)} entries, {total / (1 << 20):.1f} MiB of {cache.max_bytes / (1 << 20):.0f} MiB in {cache.root}')
+    elif cmd == 'purge':
+        prefix = args[1] if len(args) > 1 else ''
+        print(f'Removed {cache.purge(prefix)} cache entries from {cache.root}')
+    else:
+        print(f'Unknown cache command: {cmd} (use list or purge)')
+        return 1
+    return 0
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.mov', '.avi', '.m4v', '.flv', '.wmv', '.mpg', '.mpeg', '.ts', '.gif')
+
+# files as given, folders searched (recursively) for anything that looks like a video
+def find_videos(paths):
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in sorted(os.walk(path)):
+                found += [os.path.join(folder, n) for n in sorted(names) if n.lower().endswith(VIDEO_EXTENSIONS)]
+        else:
+            found.append(path)
+    return [os.path.abspath(p) for p in found]
+
+_batch_settings = None
+
+def _batch_worker_init(settings):
+    global _batch_settings
+    _render_worker_init()
+    _batch_settings = settings
+
+# frames [first, first + count) of a video (count=None: to the end) as glyphs + colors,
+# decoded by this process's own single-threaded ffmpeg
+def segment_cells(vid, size, fps, first, count, settings):
+    with FFmpegDecoder(vid, size, fps, first_frame=first, frames=count, threads=1) as decoder:
+        while True:
+            rgb = decoder.read()
+            if rgb is None:
+                return
+            yield grid_frame_to_cells(rgb, settings)
+
+def _batch_segment(args):
+    return list(segment_cells(*args, _batch_settings))
+
+# how many frames a segment gets: enough of them to keep every worker busy, but no more than
+# `seconds` each (a finished segment waits in memory until the ones before it are written)
+def segment_length(frames, fps, jobs, seconds=10):
+    return max(fps, min(int(seconds * fps), -(-frames // max(1, jobs))))
+
+# one video -> one cache entry. the video is cut into time segments that each get decoded and
+# converted by one pool worker (its own ffmpeg), and written back in order.
+# returns 'done' / 'skipped' / 'stopped'. claim(name) False = another thread has the same video
+def batch_convert_one(vid, cache, settings, fps, wide, high, pool, stop, log, claim=lambda name: True, jobs=1,
+                      segment_seconds=10):
+    info = probe_video(vid)
+    grid = fit_grid(info['width'], info['height'], wide, high)  # = playback_grid on the target terminal
+    name = cache.entry_name(video_fingerprint(vid), grid, fps, settings)
+    done = cache.open(name)
+    if done is not None:
+        done.close()
+        log(vid, 'already converted')
+        return 'skipped'
+    if not claim(name):
+        log(vid, 'same video as another file in this batch')
+        return 'skipped'
+    total = int(info['duration'] * fps)
+    writer = cache.writer(name, {
+        'wide': grid[0], 'tall': grid[1], 'fps': fps, 'chars': settings.chars,
+        'gamma': settings.gamma, 'contrast': settings.contrast,
+        'source': vid, 'duration': info['duration'], 'created': time.time(),
+    }, resume=True)
+    if writer is None:
+        log(vid, 'being written by this process already')
+        return 'skipped'
+    if writer.frames:
+        log(vid, f'resuming at frame {writer.frames}/{total}')
+    t0 = last_log = time.monotonic()
+    start = next_first = writer.frames
+    size = pixel_grid(grid, settings.chars)
+    length = segment_length(total - start, fps, jobs, segment_seconds)
+    pending = collections.deque()  # (frames asked for, result), in order
+    try:
+        while not stop.is_set():
+            while len(pending) <= jobs and (not pending or pending[-1][0] is not None):
+                # the last segment runs to the end, total is only the container's guess
+                count = length if next_first + length < total else None
+                pending.append((count, pool.apply_async(_batch_segment, ((vid, size, fps, next_first, count),))))
+                next_first += length
+            count, result = pending.popleft()
+            while not result.ready() and not stop.is_set():
+                result.wait(0.5)
+            if stop.is_set():
+                break
+            cells = result.get()
+            for glyphs, colors in cells:
+                writer.add(writer.frames, glyphs, colors, settings)
+            if count is None or len(cells) < count:  # short segment = the video ended early
+                writer.finish()
+                log(vid, f'done, {writer.frames} frames in {time.monotonic() - t0:.1f}s')
+                return 'done'
+            if time.monotonic() - last_log >= 2:
+                last_log = time.monotonic()
+                rate = (writer.frames - start) / (last_log - t0)
+                log(vid, f'{writer.frames * 100 // max(1, total)}% {writer.frames}/{total} frames, {rate:.0f} fps')
+    finally:
+        writer.suspend()  # no-op after finish(); otherwise keep the .part for next time
+    return 'stopped'
+
+# vidminal.py --convert [options] FILE_OR_FOLDER... : headless, no terminal needed
+def batch_cli(args, opts):
+    import argparse
+    import multiprocessing  # more chaos
+    from concurrent.futures import ThreadPoolExecutor
+    parser = argparse.ArgumentParser(prog='vidminal.py --convert',
+                                     description='Convert videos ahead of time so they play straight from the cache.')
+    parser.add_argument('paths', nargs='+', help='video files and/or folders to search')
+    parser.add_argument('-o', '--out', help='write here instead of the cache (never evicted; point cache_dir at it to play)')
+    # every worker runs one single-threaded ffmpeg for the segment it's on, so -j is also the cap on
+    # ffmpeg processes running at once
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='conversion processes (each decodes with its own ffmpeg, so also the most ffmpegs at once)')
+    parser.add_argument('--videos', type=int, default=2, help='videos worked on at once (they share the -j workers)')
+    parser.add_argument('--ffmpeg-jobs', dest='videos', type=int, help=argparse.SUPPRESS)  # old name of --videos
+    parser.add_argument('--segment-seconds', type=float, default=10,
+                        help='longest piece of video one worker decodes and converts in one go')
+    parser.add_argument('--wide', type=int, default=opts['wide'], help='columns (the player must have at least this many)')
+    parser.add_argument('--fps', type=int, default=opts['fps'])
+    parser.add_argument('--rows', type=int, default=shutil.get_terminal_size().lines,
+                        help="rows of the terminal that will play it (default: this one's)")
+    a = parser.parse_args(args)
+    high = max(10, int(a.rows * 0.9))  # same cap fit_grid puts on the player
+    videos = find_videos(a.paths)
+    if not videos:
+        print('No videos found.')
+        return 1
+    cache = VideoCache(a.out, None) if a.out else VideoCache.from_options(opts)
+    settings = settings_from_options(opts)
+    stop = threading.Event()
+    lock = threading.Lock()
+    claimed = set()
+    def claim(name):
+        with lock:
+            if name in claimed:
+                return False
+            claimed.add(name)
+            return True
+    def log(vid, msg):
+        with lock:
+            print(f'[{videos.index(vid) + 1}/{len(videos)}] {os.path.basename(vid)}: {msg}', flush=True)
+    def one(vid):
+        if stop.is_set():
+            return 'stopped'
+        try:
+            return batch_convert_one(vid, cache, settings, a.fps, a.wide, high, pool, stop, log, claim,
+                                     jobs=max(1, a.jobs), segment_seconds=a.segment_seconds)
+        except Exception as e:
+            log(vid, Fore.RED + f'failed: {e}' + Style.RESET_ALL)
+            return 'failed'
+    print(f'{len(videos)} videos -> {cache.root} ({a.jobs} workers, {a.videos} videos at a time)')
+    pool = multiprocessing.Pool(max(1, a.jobs), initializer=_batch_worker_init, initargs=(settings,))
+    results = []
+    try:
+        with ThreadPoolExecutor(max(1, a.videos)) as in_progress:
+            try:
+                results = list(in_progress.map(one, videos))
+            except KeyboardInterrupt:
+                stop.set()  # before the with block waits for the threads
+                raise
+    except KeyboardInterrupt:
+        print('Stopping, run the same command again to carry on.')
+        return 130
+    finally:
+        stop.set()
+        pool.terminate()
+        pool.join()
+    counts = collections.Counter(results)
+    print(', '.join(f'{n} {what}' for what, n in counts.items()))
+    return 1 if counts['failed'] else 0
+
+# asciicast v2 (asciinema play / the web player): json header line, then [seconds, "o", text] per frame
+class AsciicastWriter:
+    def __init__(self, f, width, height, title=''):
+        self.f = f
+        header = {'version': 2, 'width': width, 'height': height, 'timestamp': int(time.time()),
+                  'title': title, 'env': {'TERM': 'xterm-256color'}}
+        f.write((json.dumps(header) + '\n').encode('utf-8'))
+
+    def write(self, t, data):
+        self.f.write((json.dumps([round(t, 6), 'o', data.decode('utf-8')], ensure_ascii=False) + '\n').encode('utf-8'))
+
+    def close(self):
+        self.f.close()
+
+# raw ansi for `cat`, plus a `script`-style timing file ("delay bytes" per chunk) for `scriptreplay`
+class AnsiWriter:
+    def __init__(self, f, timing):
+        self.f = f
+        self.timing = timing
+        self.last = 0.0
+
+    def write(self, t, data):
+        self.f.write(data)
+        self.timing.write(f'{t - self.last:.6f} {len(data)}\n'.encode('ascii'))
+        self.last = t
+
+    def close(self):
+        self.f.close()
+        self.timing.close()
+
+# the timing file stays plain text even next to a .gz stream
+def ansi_timing_path(path):
+    return (path[:-3] if path.endswith('.gz') else path) + '.timing'
+
+def _open_export(path, gz):
+    import gzip
+    return gzip.open(path, 'wb') if gz else open(path, 'wb')
+
+# decode -> cells -> (delta) bytes -> writer, one frame at a time: memory doesn't grow with length.
+# delta_threshold 0 = every frame a full redraw, high=None = no row cap. returns frames written
+def export_video(vid, path, fmt='cast', fps=24, wide=160, settings=None, depth='truecolor',
+                 delta_threshold=0.5, gz=False, progress=None, high=None):
+    settings = settings or settings_from_options(load_options())
+    info = probe_video(vid)
+    grid = fit_grid(info['width'], info['height'], wide, high or sys.maxsize)  # no terminal to fit here
+    total = int(info['duration'] * fps)
+    if fmt == 'cast':
+        writer = AsciicastWriter(_open_export(path, gz), grid[0], grid[1] + 1, os.path.basename(vid))
+    else:
+        writer = AnsiWriter(_open_export(path, gz), open(ansi_timing_path(path), 'wb'))
+    delta = DeltaRenderer(delta_threshold, depth)
+    idle = _reset_bytes(settings.chars) + b'\033[%d;1H' % (grid[1] + 1)  # what a frame with no changes comes out as
+    size = pixel_grid(grid, settings.chars)
+    i = 0
+    try:
+        writer.write(0.0, b'\033[?25l\033[2J\033[H')  # hide the cursor, blank screen
+        with FFmpegDecoder(vid, size, fps) as decoder:
+            rgb = np.empty((size[1], size[0], 3), dtype=np.uint8)  # reused for every frame
+            while decoder.read_into(rgb):
+                full_before = delta.full_frames
+                out = delta.render_bytes(*grid_frame_to_cells(rgb, settings), settings.chars)
+                if delta.full_frames != full_before:
+                    # full frames draw from wherever the cursor is, and no tty adds the \r to \n for us here
+                    writer.write(i / fps, b'\033[H' + out.replace(b'\n', b'\r\n'))
+                elif out != idle:
+                    writer.write(i / fps, out)  # nothing changed: no event at all
+                i += 1
+                if progress is not None and i % (fps * 5) == 0:
+                    progress(i, total)
+        writer.write(i / fps, b'\033[?25h')
+    finally:
+        writer.close()
+    return i
+
+# vidminal.py --export VIDEO OUT [options]: replay later with asciinema / cat, no decoding or pygame there
+def export_cli(args, opts):
+    import argparse
+    parser = argparse.ArgumentParser(prog='vidminal.py --export',
+                                     description='Write the frames the player would draw to an asciicast v2 or raw ANSI file.')
+    parser.add_argument('video')
+    parser.add_argument('out', help='.cast = asciicast v2, anything else = raw ANSI (+ OUT.timing); .gz = gzip')
+    parser.add_argument('--format', choices=('cast', 'ansi'), help='override the guess from the file name')
+    parser.add_argument('--gzip', action='store_true', help='gzip the output (adds .gz if missing)')
+    parser.add_argument('--no-delta', action='store_true', help='full redraw every frame (bigger, but any frame can be a start)')
+    parser.add_argument('--wide', type=int, default=opts['wide'])
+    parser.add_argument('--fps', type=int, default=opts['fps'])
+    parser.add_argument('--rows', type=int, help='max rows (default: whatever the aspect ratio gives)')
+    parser.add_argument('--color-depth', choices=('auto',) + COLOR_DEPTHS, default=opts['color_depth'])
+    a = parser.parse_args(args)
+    out = a.out
+    gz = a.gzip or out.endswith('.gz')
+    if gz and not out.endswith('.gz'):
+        out += '.gz'
+    fmt = a.format or ('cast' if out[:-3 if out.endswith('.gz') else None].endswith('.cast') else 'ansi')
+    depth = resolve_color_depth(a.color_depth)
+    t0 = time.monotonic()
+    def progress(i, total):
+        if sys.stderr.isatty():
+            print(f'\r{i * 100 // max(1, total)}% {i}/{total} frames', end='', file=sys.stderr, flush=True)
+    n = export_video(os.path.abspath(a.video), out, fmt, a.fps, a.wide, settings_from_options(opts), depth,
+                     0.0 if a.no_delta else opts['delta_threshold'], gz, progress, a.rows)
+    size = os.path.getsize(out)
+    print(f'\r{n} frames, {size / (1 << 20):.1f} MiB ({size / max(1, n) / 1024:.1f}K/frame) -> {out} '
+          f'in {time.monotonic() - t0:.1f}s', file=sys.stderr)
+    if fmt == 'ansi':
+        timing = ansi_timing_path(out)
+        play = f'scriptreplay -t {timing} {out}' if not gz else f'scriptreplay -t {timing} <(zcat {out})'
+        print(f'play: {play}', file=sys.stderr)
+    else:
+        print(f'play: asciinema play {out}', file=sys.stderr)
+    return 0
+
+# 'host:port', ':port' (localhost) or 'unix:/path/to/socket'
+def parse_address(text):
+    if text.startswith('unix:'):
+        return 'unix', text[5:]
+    host, _, port = text.rpartition(':')
+    return 'tcp', host.strip('[]') or '127.0.0.1', int(port)
+
+# one viewer of a BroadcastServer. its own bounded queue, so a slow one only holds up itself:
+# when it's full the frame is skipped for this viewer, and the next one it gets is a full redraw
+class BroadcastClient:
+    def __init__(self, reader, writer, name, queue_frames=4):
+        import asyncio
+        self.reader = reader
+        self.writer = writer
+        self.name = name
+        self.queue = asyncio.Queue(queue_frames)
+        self.needs_full = True  # blank screen (or missed frames): deltas would draw garbage
+        self.connected = time.monotonic()
+        self.frames = 0
+        self.full_frames = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.max_queued = 0
+        self.write_time = 0.0
+
+    # delta: this frame against the one before it; full(): the whole frame, made on first ask
+    def offer(self, delta, full):
+        if self.queue.full():
+            self.skipped += 1
+            self.needs_full = True
+            return
+        if self.needs_full:
+            self.queue.put_nowait(full())
+            self.full_frames += 1
+            self.needs_full = False
+        else:
+            self.queue.put_nowait(delta)
+        self.max_queued = max(self.max_queued, self.queue.qsize())
+
+    async def pump(self):
+        while True:
+            data = await self.queue.get()
+            t = time.perf_counter()
+            self.writer.write(data)
+            await self.writer.drain()  # waits here while the socket buffer is full
+            self.write_time += time.perf_counter() - t
+            self.frames += 1
+            self.bytes += len(data)
+
+    # the viewer typing q (telnet/nc) or hanging up ends it
+    async def listen(self):
+        while True:
+            data = await self.reader.read(1024)
+            if not data or b'q' in data.lower():
+                return
+
+    def stats(self):
+        secs = max(1e-6, time.monotonic() - self.connected)
+        return {'frames': self.frames, 'full_frames': self.full_frames, 'skipped': self.skipped,
+                'kb_per_s': self.bytes / secs / 1024, 'max_queued': self.max_queued,
+                'write_ms': self.write_time / self.frames * 1000 if self.frames else 0.0, 'seconds': secs}
+
+    def stats_line(self):
+        s = self.stats()
+        return (f"{self.name}: {s['frames']} frames ({s['full_frames']} full), {s['skipped']} skipped, "
+                f"{s['kb_per_s']:.0f} KB/s, queue max {s['max_queued']}, write avg {s['write_ms']:.1f}ms")
+
+# --serve: decode + convert + encode once, fan the bytes out to every viewer over asyncio.
+# each frame is encoded twice at most: as a delta against the last frame (what keeping-up
+# viewers get) and, only if someone needs it, whole (new or lagging viewers)
+class BroadcastServer:
+    def __init__(self, vid, address, fps=24, grid=(160, 45), settings=None, depth='truecolor',
+                 delta_threshold=0.5, loop_video=False, queue_frames=4, log=print, stats_every=10.0):
+        self.vid = vid
+        self.address = address
+        self.fps = fps
+        self.grid = tuple(grid)
+        self.settings = settings or settings_from_options(load_options())
+        self.depth = depth
+        self.delta = DeltaRenderer(delta_threshold, depth)
+        self.loop_video = loop_video
+        self.queue_frames = queue_frames
+        self.log = log
+        self.stats_every = stats_every
+        self.clients = set()
+        self.handlers = set()
+        self.connections = 0
+        self.finished = None  # asyncio.Event once running, set when the video is over
+        self.decoder = None
+        self.rgb = None
+        self.index = 0
+        self.sent = 0
+
+    # one frame, off the event loop: (delta bytes, is it a full redraw, glyphs, colors), None at the end
+    def _next(self):
+        size = pixel_grid(self.grid, self.settings.chars)
+        if self.decoder is None:
+            self.decoder = FFmpegDecoder(self.vid, size, self.fps)
+            self.rgb = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        if not self.decoder.read_into(self.rgb):
+            self.decoder.close()
+            self.decoder = None
+            if not self.loop_video or self.index == 0:
+                return None
+            self.index = 0
+            return self._next()
+        self.index += 1
+        glyphs, colors = grid_frame_to_cells(self.rgb, self.settings)
+        before = self.delta.full_frames
+        out = self.delta.render_bytes(glyphs, colors, self.settings.chars)
+        return out, self.delta.full_frames != before, glyphs, colors
+
+    def _wrap(self, data):
+        return TerminalWriter.SYNC_BEGIN + data + TerminalWriter.SYNC_END
+
+    async def _serve_client(self, reader, writer):
+        import asyncio
+        self.connections += 1
+        peer = writer.get_extra_info('peername')
+        name = f'{peer[0]}:{peer[1]}' if isinstance(peer, tuple) else f'unix#{self.connections}'
+        client = BroadcastClient(reader, writer, name, self.queue_frames)
+        self.clients.add(client)
+        self.handlers.add(asyncio.current_task())
+        self.log(f'+ {name} ({len(self.clients)} watching)')
+        writer.write(b'\033[?25l\033[0m\033[2J\033[H')  # hide the cursor, blank screen
+        pump = asyncio.ensure_future(client.pump())
+        listen = asyncio.ensure_future(client.listen())
+        over = asyncio.ensure_future(self.finished.wait())
+        try:
+            # pump only ends by error, listen when the viewer leaves, over when the video does
+            await asyncio.wait([pump, listen, over], return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            pass  # ctrl+c on the server, still say goodbye below
+        finally:
+            self.clients.discard(client)
+            self.handlers.discard(asyncio.current_task())
+            for task in (pump, listen, over):
+                task.cancel()
+            with contextlib.suppress(ConnectionError, OSError):
+                writer.write(b'\033[0m\033[?25h\r\n')
+                writer.close()
+            self.log(f'- {client.stats_line()}')
+
+    async def _frames(self):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.fps
+        t0 = loop.time()
+        last_stats = t0
+        pending = loop.run_in_executor(None, self._next)
+        while True:
+            got = await pending
+            if got is None:
+                return
+            pending = loop.run_in_executor(None, self._next)  # decode the next one while this one waits
+            out, is_full, glyphs, colors = got
+            now = loop.time()
+            due = t0 + self.sent * period
+            if now - due > 1.0:
+                t0, due = now - self.sent * period, now  # fell way behind (slow decode): don't burst
+            await asyncio.sleep(max(0.0, due - now))
+            made = []
+            def full():
+                if not made:
+                    body = out if is_full else cells_to_bytes(glyphs, colors, self.settings.chars, self.depth)
+                    made.append(self._wrap(b'\033[H' + body.replace(b'\n', b'\r\n')))
+                return made[0]
+            delta = full() if is_full else self._wrap(out)
+            for client in list(self.clients):
+                client.offer(delta, full)
+            self.sent += 1
+            if self.clients and loop.time() - last_stats >= self.stats_every:
+                last_stats = loop.time()
+                for client in self.clients:
+                    self.log(f'  {client.stats_line()}')
+
+    async def run(self):
+        import asyncio
+        self.finished = asyncio.Event()
+        kind = self.address[0]
+        if kind == 'unix':
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.address[1])  # left over from a server that didn't get to clean up
+            server = await asyncio.start_unix_server(self._serve_client, path=self.address[1])
+        else:
+            server = await asyncio.start_server(self._serve_client, self.address[1], self.address[2])
+        try:
+            async with server:
+                await self._frames()
+                deadline = time.monotonic() + 2
+                while any(not c.queue.empty() for c in self.clients) and time.monotonic() < deadline:
+                    await asyncio.sleep(0.05)  # let the last frames go out
+                self.finished.set()
+                if self.handlers:
+                    await asyncio.wait(list(self.handlers), timeout=2)  # goodbyes written, stats logged
+        finally:
+            if self.decoder is not None:
+                self.decoder.close()
+            if kind == 'unix':
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self.address[1])
+        return self.sent
+
+# vidminal.py --serve VIDEO [options]: one decode, many viewers (--watch, nc, telnet)
+def serve_cli(args, opts):
+    import argparse
+    import asyncio
+    parser = argparse.ArgumentParser(prog='vidminal.py --serve',
+                                     description='Convert a video once and stream it to many terminals.')
+    parser.add_argument('video')
+    parser.add_argument('--listen', default='127.0.0.1:7878', help="host:port or unix:/path (default: 127.0.0.1:7878)")
+    parser.add_argument('--wide', type=int, default=opts['wide'])
+    parser.add_argument('--fps', type=int, default=opts['fps'])
+    parser.add_argument('--rows', type=int, default=40, help="max rows, the viewers' terminals need this many + 1")
+    parser.add_argument('--color-depth', choices=('auto',) + COLOR_DEPTHS, default=opts['color_depth'],
+                        help='auto = truecolor, there is no one terminal to ask')
+    parser.add_argument('--loop', action='store_true', help='start over at the end instead of stopping')
+    parser.add_argument('--queue', type=int, default=4, help='frames queued per viewer before it starts skipping')
+    parser.add_argument('--no-delta', action='store_true', help='full redraw every frame')
+    a = parser.parse_args(args)
+    address = parse_address(a.listen)
+    info = probe_video(os.path.abspath(a.video))
+    grid = fit_grid(info['width'], info['height'], a.wide, a.rows)
+    depth = 'truecolor' if a.color_depth == 'auto' else a.color_depth
+    server = BroadcastServer(os.path.abspath(a.video), address, a.fps, grid, settings_from_options(opts), depth,
+                             0.0 if a.no_delta else opts['delta_threshold'], a.loop, max(1, a.queue),
+                             log=lambda msg: print(msg, flush=True))
+    where = f'unix:{address[1]}' if address[0] == 'unix' else f'{address[1]}:{address[2]}'
+    print(f'Serving {os.path.basename(a.video)} at {grid[0]}x{grid[1]} on {where} '
+          f'(watch: vidminal.py --watch {where}), ctrl+c stops', flush=True)
+    try:
+        sent = asyncio.run(server.run())
+    except KeyboardInterrupt:
+        print('Stopped.')
+        return 130
+    print(f'Done, {sent} frames sent.')
+    return 0
+
+# vidminal.py --watch ADDRESS: thin client, puts what the server sends on this terminal. q quits
+def watch_cli(args, opts):
+    import argparse
+    import socket
+    parser = argparse.ArgumentParser(prog='vidminal.py --watch', description='Watch a vidminal --serve stream.')
+    parser.add_argument('address', nargs='?', default='127.0.0.1:7878', help='host:port or unix:/path')
+    a = parser.parse_args(args)
+    address = parse_address(a.address)
+    if address[0] == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(address[1])
+    else:
+        sock = socket.create_connection(address[1:])
+    out = TerminalWriter(sync=False)  # the server already wraps every frame
+    keys = KeyReader()
+    t0 = time.monotonic()
+    total = 0
+    try:
+        with sock:
+            sock.settimeout(0.25)
+            while not any(k in ('q', 'Q') for k in keys.drain()):
+                try:
+                    data = sock.recv(1 << 16)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break  # server stopped
+                total += len(data)
+                out.add(data)
+                out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        keys.close()
+        out.add(b'\033[0m\033[?25h\n')
+        out.flush()
+    secs = max(1e-6, time.monotonic() - t0)
+    stats = out.stats()
+    print(f'{total / (1 << 20):.1f} MiB in {secs:.0f}s ({total / secs / 1024:.0f} KB/s), '
+          f"terminal writes avg {stats['write_ms_mean']:.1f}ms max {stats['write_ms_max']:.0f}ms")
+    return 0
+
+# streams video/audio in parallel, ffmpeg decodes straight into a FrameRing at cell size.
+# with a VideoCache: replays come from the memory-mapped entry, first plays fill it
+def get_stuff_from_video_stream(vid, out, speed=24, buffer_size=24, wide=None, cache=None, settings=None,
+                                render_workers=0, options=None, info=None, pool=None):
     if not os.path.exists(out):
         os.makedirs(out)
-    audio = os.path.join(out, 'audio.ogg')
-    print('Doing video things...')
-    clip = VideoFileClip(vid)
-    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
-        clip.audio.write_audiofile(audio, codec='libvorbis')
-    frame_queue = queue.Queue(maxsize=buffer_size*2)
-    total_frames = int(clip.fps * clip.duration)
-    video_duration = clip.duration
+    info = info or probe_video(vid)
+    total_frames = int(info['duration'] * speed)
+    video_duration = info['duration']
+    audio = vid if info['has_audio'] else None  # the player's AudioStream decodes it as it plays
+    entry = fingerprint = None
+    if cache is not None:
+        settings = settings or settings_from_options(load_options())
+        fingerprint = video_fingerprint(vid)
+        grid = playback_grid(info['width'], info['height'], wide)
+        entry = cache.entry_name(fingerprint, grid, speed, settings)
+        cached_frames = cache.open(entry)
+        if cached_frames is not None:
+            return out, audio, cached_frames, cached_frames.count, video_duration
+    if options is None:
+        settings = settings or settings_from_options(load_options())
+    current_chars = (lambda: options.render.chars) if options is not None else (lambda: settings.chars)
+    frame_ring = FrameRing(buffer_size * 2)
+    frame_ring.timings = timings = StageTimes()
+    if cache is not None:
+        writer = cache.writer(entry, {
+            'wide': grid[0], 'tall': grid[1], 'fps': speed, 'chars': settings.chars,
+            'gamma': settings.gamma, 'contrast': settings.contrast,
+            'source': vid, 'duration': video_duration, 'created': time.time(),
+        })
+        if writer is not None:  # else the same video is being recorded already, this run just plays
+            frame_ring.cache_writer = CacheRecorder(writer)
     def extract_frames():
-        for i, frame in enumerate(clip.iter_frames(fps=speed, dtype='uint8')):
-            frame_path = os.path.join(out, f'frame_{i+1:05d}.png')
-            Image.fromarray(frame).save(frame_path)
-            try:
-                frame_queue.put_nowait(frame_path)
-            except queue.Full:
-                pass  # Don't block extraction, just skip putting in queue
-        frame_queue.put(None)
-    threading.Thread(target=extract_frames, daemon=True).start()
-    return out, audio, frame_queue, total_frames, video_duration
-
-# plays ascii video + audio from stream, handles pause/quit
-def play_ascii_video_stream_streaming(folder, audio, frame_queue, total_frames, speed=24, wide=160, buffer_size=24, video_duration=None, seek_jump_seconds=5, fine_seek_seconds=1):
+        generation, start = 0, 0
+        while generation is not None:
+            # re-fit on every start/seek/resize so frames always match the terminal
+            cells = playback_grid(info['width'], info['height'], wide)
+            if frame_ring.scale < 1:
+                cells = fit_grid(info['width'], info['height'], max(20, int(cells[0] * frame_ring.scale)), cells[1])
+            wide_now, rows = pixel_grid(cells, current_chars())
+            shape = (max(1, rows), max(1, wide_now), 3)
+            with FFmpegDecoder(vid, (shape[1], shape[0]), speed, start / speed) as decoder:
+                i = start
+                while True:
+                    got = frame_ring.acquire(generation, shape)
+                    if got is None:
+                        break  # seek or quit
+                    slot_no, slot = got
+                    t = time.perf_counter()
+                    if not decoder.read_into(slot):
+                        frame_ring.finish(generation)
+                        break
+                    timings.add('extract', t, i)
+                    if not frame_ring.commit(generation, slot_no, i):
+                        break
+                    i += 1
+            generation, start = frame_ring.next_generation(generation)
+    frame_source = frame_ring
+    if render_workers > 0:
+        # pool forks before the extractor thread exists; settings follow options.json if we have it
+        if options is not None:
+            current = (lambda: options.render), (lambda: resolve_color_depth(options['color_depth']))
+        else:
+            current = (lambda: settings), detect_color_depth
+        try:
+            frame_source = RenderAhead(frame_ring, render_workers, buffer_size, *current, pool=pool)
+        except OSError:
+            pass  # no worker processes here, the player converts every frame itself
+    threading.Thread(target=extract_frames, daemon=True, name='extract').start()
+    return out, audio, frame_source, total_frames, video_duration
+
+# what stays from one video to the next in a playlist: mixer, keys, the terminal writer, what's
+# on screen (the DeltaRenderer's last frame) and volume/mute/HUD. a lone video makes its own
+class PlayerSession:
+    def __init__(self, opts, playlist=False):
+        import pygame  # sound go beep
+        pygame.mixer.init()
+        self.pygame = pygame
+        self.playlist = playlist  # N skips to the next video
+        self.keys = KeyReader()
+        self.out = TerminalWriter(sync=opts['sync_output'])
+        self.delta = DeltaRenderer(opts['delta_threshold'], resolve_color_depth(opts['color_depth']))
+        self.state = {
+            'volume': float(opts.get('audio_volume_start', 1.0)),
+            'is_muted': False,
+            'hud': bool(opts['show_hud']),
+        }
+        self.fresh = True  # nothing of ours on the screen yet
+        self.trace = None
+
+    # the trace_file every video of the session writes to, opened on first use
+    def trace_file(self, path):
+        if self.trace is None or self.trace.path != path:
+            if self.trace is not None:
+                self.trace.close()
+            self.trace = TraceFile(path)
+        return self.trace
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+        self.keys.close()
+        self.pygame.mixer.quit()
+
+# plays ascii video + audio from stream, handles pause/quit.
+# session/sound: a playlist's PlayerSession and the (primed) AudioStream it made for this video
+def play_ascii_video_stream_streaming(folder, audio, frame_ring, total_frames, speed=24, wide=160, buffer_size=24, video_duration=None, seek_jump_seconds=5, fine_seek_seconds=1, options=None,
+                                      session=None, sound=None):
     import queue as pyqueue
-    pygame.mixer.init()
     delay = 1.0 / speed
     stop_flag = threading.Event()
     pause_flag = threading.Event()
     pause_flag.clear()
-    opts = load_options()
-    playback_state = {
-        'volume': float(opts.get('audio_volume_start', 1.0)),
-        'is_muted': False,
-    }
+    opts = options if options is not None else OptionsWatcher()
+    own_session = session is None
+    if own_session:
+        session = PlayerSession(opts)
+    playback_state = session.state
     rewind_forward = pyqueue.Queue()
+    ended = 'end'  # or 'quit' / 'next'
 
-    def keyboard_listener():
-        import platform
-        is_windows = platform.system() == 'Windows'
-        while not stop_flag.is_set():
-            key = getch()
-            if not key:
-                time.sleep(0.05)
-                continue
-            if key == ' ':
-                if pause_flag.is_set():
-                    pause_flag.clear()
-                else:
-                    pause_flag.set()
-            elif key in ('q', 'Q'):
-                stop_flag.set()
-            elif key in ('m', 'M'):
-                playback_state['is_muted'] = not playback_state['is_muted']
-            elif key in ('-', '_'):
-                # Decrease volume, ensure it doesn't go below 0
-                playback_state['volume'] = max(0.0, round(playback_state['volume'] - 0.1, 1))
-            elif key in ('+', '='):
-                playback_state['volume'] = min(1.0, round(playback_state['volume'] + 0.1, 1))
-                playback_state['is_muted'] = False
-            elif key in ('a', 'A'):
-                rewind_forward.put(-seek_jump_seconds * speed)
-            elif key in ('d', 'D'):
-                rewind_forward.put(seek_jump_seconds * speed)
-            elif is_windows:
-                # Windows arrow keys: first getch() returns '\xe0', next is code
-                if key in ('\xe0', '\x00'):
-                    next_key = getch()
-                    if next_key == 'M':  # right arrow
-                        rewind_forward.put(fine_seek_seconds * speed)
-                    elif next_key == 'K':  # left arrow
-                        rewind_forward.put(-fine_seek_seconds * speed)
+    def handle_key(key):
+        nonlocal ended
+        if key == ' ':
+            if pause_flag.is_set():
+                pause_flag.clear()
             else:
-                # Unix: arrow keys are '\x1b', '[', 'C'/'D'
-                if key == '\x1b':
-                    next1 = getch()
-                    if next1 == '[':
-                        next2 = getch()
-                        if next2 == 'C':  # right arrow
-                            rewind_forward.put(fine_seek_seconds * speed)
-                        elif next2 == 'D':  # left arrow
-                            rewind_forward.put(-fine_seek_seconds * speed)
-            time.sleep(0.05)
+                pause_flag.set()
+        elif key in ('q', 'Q'):
+            ended = 'quit'
+            stop_flag.set()
+        elif key in ('n', 'N') and session.playlist:
+            ended = 'next'
+            stop_flag.set()
+        elif key in ('m', 'M'):
+            playback_state['is_muted'] = not playback_state['is_muted']
+        elif key in ('i', 'I'):
+            playback_state['hud'] = not playback_state['hud']
+        elif key in ('-', '_'):
+            # Decrease volume, ensure it doesn't go below 0
+            playback_state['volume'] = max(0.0, round(playback_state['volume'] - 0.1, 1))
+        elif key in ('+', '='):
+            playback_state['volume'] = min(1.0, round(playback_state['volume'] + 0.1, 1))
+            playback_state['is_muted'] = False
+        elif key in ('a', 'A'):
+            rewind_forward.put(-seek_jump_seconds * speed)
+        elif key in ('d', 'D'):
+            rewind_forward.put(seek_jump_seconds * speed)
+        elif key == 'right':
+            rewind_forward.put(fine_seek_seconds * speed)
+        elif key == 'left':
+            rewind_forward.put(-fine_seek_seconds * speed)
 
-    key_thread = threading.Thread(target=keyboard_listener, daemon=True)
-    key_thread.start()
+    # keys are handled here on the player thread, whenever it's about to look at the state
+    def handle_keys():
+        for key in keys.drain():
+            handle_key(key)
+
+    keys = session.keys
+
+    if sound is None:
+        sound = AudioStream(audio)  # audio = the video itself (decoded as it plays) or None
 
     def play_audio_from(pos, fade_ms=100):
-        pygame.mixer.music.load(audio)
-        pygame.mixer.music.set_volume(0.0 if playback_state['is_muted'] else playback_state['volume'])
-        pygame.mixer.music.play(start=pos, fade_ms=fade_ms)
+        sound.set_volume(0.0 if playback_state['is_muted'] else playback_state['volume'])
+        sound.seek(pos, fade_ms=fade_ms)
+        sound.wait_started(1.0)  # first chunk is out, the video starts with it
 
     def format_time(t):
         t = int(t)
         return f"{t//3600:02}:{(t%3600)//60:02}:{t%60:02}"
 
-    print('\x1b[2J', end='')  # clear screen
-    start = time.time()
+    out = session.out
+    if session.fresh:
+        out.add('\x1b[2J')  # clear screen
+        out.flush()
+        session.fresh = False
+    frame_ring.wait_filled(buffer_size)  # pre-buffer
     play_audio_from(0, fade_ms=0)
+    sync = AVSync(sound.position, speed, opts['frame_drop_ms'] / 1000)
+    timings = getattr(frame_ring, 'timings', None) or StageTimes()  # cache hits have no extractor
+    if opts['trace_file']:
+        timings.start_trace(session.trace_file(opts['trace_file']))
+    hud_shown = playback_state['hud']
     i = 0
-    frames_buffer = []
-    # Pre-buffer
-    while len(frames_buffer) < buffer_size:
-        frame_path = frame_queue.get()
-        if frame_path is None:
-            break
-        frames_buffer.append(frame_path)
+    buffering_message = opts['buffering_message']
+    from_cache = isinstance(frame_ring, CachedFrames)
+    rendered = isinstance(frame_ring, RenderAhead)
+    cache_writer = getattr(frame_ring, 'cache_writer', None)  # a CacheRecorder
+
+    # a frame that won't be drawn still goes into the recording, or the cache would have a hole
+    def record_skipped(got):
+        index, frame = got
+        if cache_writer is None:
+            return
+        if rendered:
+            cache_writer.add(index, frame.glyphs, frame.colors, frame.settings)
+        else:
+            cache_writer.add_frame(index, frame, opts.render)  # converted on the recorder's thread
+    delta = session.delta  # the last video's frame is still up, the first one can be a delta
+    ring = getattr(frame_ring, 'source', frame_ring)  # the FrameRing under a RenderAhead
+    quality = QualityController(speed, delta.depth, can_resize=not from_cache and cache_writer is None)
+    half_shown = half_block(opts.render.chars)
+    # the cache can already jump anywhere instantly, only live decoding needs a history
+    history = FrameHistory(0 if from_cache else opts['seek_history_seconds'] * speed)
+    replay = None  # frames coming out of the history instead of the ring
     total_time = video_duration if video_duration is not None else (total_frames / speed if total_frames > 0 else 0)
-    import shutil
-    last_term_size = shutil.get_terminal_size()
+    last_term_size = TERMINAL.get()
+    wake_on_resize = lambda: keys.put('resize')  # redraw now, not when the frame wait is over
+    TERMINAL.listeners.append(wake_on_resize)
     last_audio_seek = 0
-    while not stop_flag.is_set() and frames_buffer:
+    while not stop_flag.is_set():
+        handle_keys()
+        if stop_flag.is_set():
+            break
+        if cache_writer is not None and cache_writer.failed:
+            cache_writer.abort()  # seek/resize/option change/too busy, recording is no good
+            cache_writer = None
         # Handle rewind/forward requests
         jump = 0
         while not rewind_forward.empty():
             jump += rewind_forward.get()
         if jump != 0:
             target_i = max(0, min(i + jump, total_frames - 1))
-            pygame.mixer.music.fadeout(50)  # fade out audio before seek
-            frames_buffer.clear()
-            frame_path = os.path.join(folder, f'frame_{target_i+1:05d}.png')
-            wait_count = 0
-            while not os.path.exists(frame_path):
-                print('\x1b[2J\x1b[H', end='')
-                print('Buffering...'.center(wide), end='\n')
-                time.sleep(0.02)
-                wait_count += 1
-                if wait_count > 400:
-                    break
-            if os.path.exists(frame_path):
-                frames_buffer.append(frame_path)
-            for idx in range(target_i+1, min(target_i+1+buffer_size, total_frames)):
-                next_path = os.path.join(folder, f'frame_{idx+1:05d}.png')
-                if os.path.exists(next_path):
-                    frames_buffer.append(next_path)
-                else:
-                    break
+            sound.pause()  # quiet until the new spot is ready
+            replay = history.since(target_i)
+            if replay:
+                frame_ring.reset(history.end)  # recent enough: replay from memory, decoder picks up after it
+            else:
+                frame_ring.reset(target_i)  # extractor restarts at target_i
+            while not replay and not frame_ring.wait_filled(1, timeout=0.1) and not stop_flag.is_set():
+                out.add('\x1b[2J\x1b[H' + buffering_message.center(wide) + '\n')
+                out.flush()
+                delta.invalidate()
+                handle_keys()
             i = target_i
-            start = time.time() - i * delay
-            if frames_buffer:
-                play_audio_from(i * delay, fade_ms=50)
-                last_audio_seek = time.time()
+            timings.mark('seek', i)
+            play_audio_from(i * delay, fade_ms=50)
+            last_audio_seek = time.time()
         if pause_flag.is_set():
-            pygame.mixer.music.pause()
-            paused_at = i * delay
+            sound.pause()  # stops the clock too, so the video waits with it
             while pause_flag.is_set() and not stop_flag.is_set():
-                time.sleep(0.1)
+                keys.wait(0.5)  # asleep until a key comes in
+                handle_keys()
             if stop_flag.is_set():
                 break
-            play_audio_from(paused_at, fade_ms=50)
+            sound.resume()  # picks up mid-chunk, no new decode
             last_audio_seek = time.time()
-            start = time.time() - paused_at
-        tgt = start + i * delay
-        now = time.time()
-        sleep_for = tgt - now
-        if sleep_for > 0:
-            time.sleep(sleep_for)
+        thin = quality.thin(i) if opts['adaptive_quality'] else 0
+        while thin > 0:  # drawing every n-th frame only: the rest are skipped before converting
+            replaying = bool(replay)
+            try:
+                got = replay.popleft() if replaying else frame_ring.get(timeout=delay)
+            except queue.Empty:
+                break
+            if got is None:
+                break
+            if not replaying:
+                record_skipped(got)
+            i = got[0] + 1
+            thin -= 1
+        t = time.perf_counter()
+        due = sync.wait(i, sleep=keys.wait)  # a key press ends the sleep early
+        timings.add('sleep', t, i)
+        if not due:
+            continue  # audio hasn't got there yet (or a key came in), go look at the keys
+        if opts.refresh():  # pick up options.json edits without reading it every frame
+            history.clear()  # drawn with the old settings
+            if half_block(opts.render.chars) != half_shown and not from_cache:
+                replay = None
+                frame_ring.reset(i)  # half blocks need twice the pixel rows from the decoder
+            half_shown = half_block(opts.render.chars)
         current_vol = 0.0 if playback_state['is_muted'] else playback_state['volume']
-        if pygame.mixer.music.get_volume() != current_vol:
-            pygame.mixer.music.set_volume(current_vol)
-        try:
-            term_size = shutil.get_terminal_size()
-        except Exception:
-            term_size = last_term_size
+        sound.set_volume(current_vol)
+        term_size = TERMINAL.get()  # only really looked up after a SIGWINCH
         if term_size != last_term_size:
             if opts.get('clear_screen_on_resize', True):
-                print('\x1b[2J\x1b[H', end='')
+                out.add('\x1b[2J\x1b[H')
+            delta.invalidate()
             last_term_size = term_size
+            replay = None
+            history.clear()
+            frame_ring.reset(i)  # decoder restarts at the new cell grid
         else:
-            print('\x1b[H', end='')
+            out.add('\x1b[H')
+        depth = resolve_color_depth(opts['color_depth'])
+        adaptive = opts['adaptive_quality']
+        # a narrower picture can't go in the cache, so the width holds while a recording runs
+        resizable = not from_cache and cache_writer is None
+        if adaptive and quality.key != (depth, resizable):
+            quality.configure(depth, resizable)  # depth was changed by hand (or recording ended), start over
+        scale = quality.current.scale if adaptive else 1.0
+        if scale != ring.scale:
+            ring.scale = scale
+            out.add('\x1b[2J\x1b[H')  # a narrower frame leaves the old one showing around it
+            delta.invalidate()
+            replay = None
+            history.clear()
+            frame_ring.reset(i)  # decoder restarts at the new width
+        if playback_state['hud'] != hud_shown:
+            out.add('\x1b[2J\x1b[H')  # HUD line came or went
+            delta.invalidate()
+            hud_shown = playback_state['hud']
         actual_frame_wide = wide
-        if frames_buffer:
-            ascii_frame_output, actual_frame_wide = pic_to_ascii(frames_buffer[0], wide)
-            print(ascii_frame_output, end='')
+        sync.drop_after = opts['frame_drop_ms'] / 1000
+        skip = sync.behind(i)
+        while skip > 0:  # too far behind the audio: throw frames away before converting them
+            replaying = bool(replay)
+            try:
+                dropped = replay.popleft() if replaying else frame_ring.get(timeout=0)
+            except queue.Empty:
+                break  # decoder is behind as well, nothing to throw away yet
+            if dropped is None:
+                break
+            if not replaying:
+                record_skipped(dropped)
+            timings.mark('drop', dropped[0])
+            i = dropped[0] + 1
+            sync.dropped += 1
+            skip -= 1
+        replaying = bool(replay)
+        try:
+            got = replay.popleft() if replaying else frame_ring.get(timeout=delay)
+        except queue.Empty:
+            got = False  # extractor is behind, show that instead of a frame
+        if got is None:
+            if cache_writer is not None:
+                cache_writer.finish()  # watched start to end in one go, keep it (once the recorder caught up)
+                cache_writer = None
+            break  # end of video
+        if got:
+            i, frame = got
+            t = time.perf_counter()
+            delta.threshold = opts['delta_threshold']
+            delta.depth = quality.current.depth if adaptive else depth
+            full = None
+            if replaying:
+                glyphs, colors, chars = frame  # drawn a moment ago, still in memory
+            elif from_cache:
+                glyphs, colors = frame  # already converted, straight off the mmap
+                chars = frame_ring.chars
+            else:
+                if rendered and frame.settings is opts.render:
+                    glyphs, colors = frame.glyphs, frame.colors  # a worker did it ahead of time
+                    full = frame.ansi if frame.depth == delta.depth else None
+                else:
+                    glyphs, colors = grid_frame_to_cells(frame.rgb if rendered else frame, opts.render)
+                chars = opts.render.chars
+                if cache_writer is not None and not cache_writer.add(i, glyphs, colors, opts.render):
+                    cache_writer.abort()  # seek/resize/option change, recording is no good
+                    cache_writer = None
+                history.add(i, glyphs, colors, chars)
+            delta.budget = opts['halfblock_budget_kb'] << 10 if half_block(chars) else 0
+            if delta.prev_glyphs is not None and delta.prev_glyphs.shape != glyphs.shape:
+                out.add('\x1b[2J\x1b[H')  # next playlist video has another size, the old one mustn't show around it
+            out.add(delta.render_bytes(glyphs, colors, chars, full))  # only the cells that changed
+            actual_frame_wide = glyphs.shape[1]
+            cost = time.perf_counter() - t
+            timings.add('convert', t, i)
         else:
-            print('Buffering...'.center(actual_frame_wide), end='\n')
+            out.add(buffering_message.center(actual_frame_wide) + '\n')
+            delta.invalidate()
         play_emoji = '⏸️' if not pause_flag.is_set() else '▶️'
         vol_bar_width = 10
         vol_icon = '🔇' if playback_state['is_muted'] or playback_state['volume'] == 0 else '🔊'
@@ -530,26 +3426,238 @@ def play_ascii_video_stream_streaming(folder, audio, frame_queue, total_frames,
             vol_level = int(round(playback_state['volume'] * vol_bar_width))
             vol_bar = '█' * vol_level + '-' * (vol_bar_width - vol_level)
         vol_str = f" {vol_icon}[{vol_bar}]"
+        bytes_str = f" {delta.last_bytes / 1024:.1f}K/f"  # bytes written for this frame
+        if adaptive:
+            bytes_str += quality.label()
         time_str = f"{format_time(i / speed)} / {format_time(total_time)}"
-        fixed_len = 2 + 4 + len(time_str) + len(vol_str)
+        fixed_len = 2 + 4 + len(time_str) + len(vol_str) + len(bytes_str)
         bar_width = max(1, actual_frame_wide - fixed_len)
         bar_pos = int((i / (total_frames - 1)) * bar_width) if total_frames > 1 else 0
         bar = '█' * bar_pos + '-' * (bar_width - bar_pos)
-        print(f"{play_emoji} [{bar}] {time_str}{vol_str}")
-        i += 1
-        if frames_buffer:
-            frames_buffer.pop(0)
-        next_idx = i + len(frames_buffer)
-        if next_idx < total_frames:
-            next_path = os.path.join(folder, f'frame_{next_idx+1:05d}.png')
-            if os.path.exists(next_path):
-                frames_buffer.append(next_path)
+        out.add(f"{play_emoji} [{bar}] {time_str}{vol_str}{bytes_str}\n")
+        if hud_shown:
+            out.add(timings.hud(frame_ring.queued())[:last_term_size.columns] + '\x1b[K\n')
+        t = time.perf_counter()
+        out.flush()  # the whole tick in one write; slow terminal = long block here
+        timings.add('print', t, i)
+        if got:
+            if adaptive:
+                quality.add(cost + time.perf_counter() - t)  # takes effect from the next frame
+            timings.frame_out(out.last_bytes)
+            sync.show(i)
+            i += 1
     stop_flag.set()
-    pygame.mixer.music.stop()
-    key_thread.join()
-    pygame.mixer.quit()
+    if cache_writer is not None:
+        cache_writer.abort()
+    frame_ring.close()
+    timings.close()
+    sound.close()
+    TERMINAL.listeners.remove(wake_on_resize)
+    if own_session:
+        session.close()
+    return dict(sync.stats(), **out.stats(), **quality.stats(), ended=ended)
+
+PLAYLIST_EXTENSIONS = ('.m3u', '.m3u8', '.txt')
 
-def pic_from_ascii_txt(txt_path):
+# files, folders (searched like --convert) and .m3u/.txt lists (a path per line, # = comment,
+# relative to the list) -> video paths, in order
+def read_playlist(paths):
+    videos = []
+    for path in paths:
+        if os.path.isfile(path) and path.lower().endswith(PLAYLIST_EXTENSIONS):
+            base = os.path.dirname(os.path.abspath(path))
+            with open(path, encoding='utf-8-sig') as f:
+                lines = [line.strip() for line in f]
+            videos += read_playlist([os.path.join(base, line) for line in lines if line and not line.startswith('#')])
+        else:
+            videos += find_videos([path])
+    return videos
+
+# the next playlist video, got ready in the background while the one before it plays: probed,
+# frame source started with its first frames decoded, first second of audio decoded. the ring is
+# sized so that stays under `max_bytes`. cancel() stops it wherever it got to and frees it all
+class PlaylistItem:
+    def __init__(self, vid, opts, fps, width, temp, cache=None, workers=0, pool=None, max_bytes=64 << 20,
+                 audio_seconds=1.0):
+        self.vid = vid
+        self.opts = opts
+        self.fps = fps
+        self.width = width
+        self.temp = temp
+        self.cache = cache
+        self.workers = workers
+        self.pool = pool
+        self.max_bytes = max_bytes
+        self.audio_seconds = audio_seconds
+        self.buffer_size = fps
+        self.stream = None  # what get_stuff_from_video_stream returned
+        self.sound = None
+        self.error = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        threading.Thread(target=self._prepare, daemon=True, name='prefetch').start()
+
+    # frames to read ahead: the ring keeps two per buffered frame, plus a render slot each with workers
+    def _buffer_size(self, info):
+        cells = playback_grid(info['width'], info['height'], self.width)
+        wide, rows = pixel_grid(cells, self.opts.render.chars)
+        per_frame = 2 * wide * rows * 3 + (_slot_size(cells[::-1]) if self.workers else 0)
+        return max(1, min(self.fps, self.max_bytes // per_frame))
+
+    def _prepare(self):
+        try:
+            info = probe_video(self.vid)
+            self.buffer_size = self._buffer_size(info)
+            stream = get_stuff_from_video_stream(self.vid, self.temp, speed=self.fps, buffer_size=self.buffer_size,
+                                                 wide=self.width, cache=self.cache, settings=self.opts.render,
+                                                 render_workers=self.workers, options=self.opts, info=info,
+                                                 pool=self.pool)
+            sound = AudioStream(stream[1])
+            with self.lock:
+                self.stream, self.sound = stream, sound
+                cancelled = self.cancelled
+            if cancelled:
+                self._close(stream, sound)
+                return
+            sound.prime(0.0, self.audio_seconds)
+            stream[2].wait_filled(self.buffer_size)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ready.set()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            stream, sound = self.stream, self.sound
+        self._close(stream, sound)
+
+    @staticmethod
+    def _close(stream, sound):
+        if sound is not None:
+            sound.close()
+        if stream is not None:
+            writer = getattr(stream[2], 'cache_writer', None)
+            if writer is not None:
+                writer.abort()
+            stream[2].close()
+
+# videos back to back in one player session. while one plays the next is prefetched, so it starts
+# the moment this one ends, screen and sound carrying straight on. N skips, Q stops, loop=True goes
+# round forever (kiosks). returns (video, stats or None, error or None) for the last 100
+def play_playlist(videos, opts, loop=False):
+    temp = opts['temp']
+    fps = int(opts['fps'])
+    width = int(opts['wide'])
+    cache = VideoCache.from_options(opts) if opts['cache_enabled'] else None
+    workers = opts['render_workers']
+    if workers < 0:
+        workers = min(4, (os.cpu_count() or 1) - 1)  # leave a core for decoding + playback
+    pool = render_pool(workers) if workers > 0 else None  # one for all videos, forked before any thread
+    if pool is None:
+        workers = 0  # none wanted, or they wouldn't start
+
+    def upcoming():
+        while True:
+            yield from videos
+            if not loop:
+                return
+    order = upcoming()
+
+    def prefetch():
+        vid = next(order, None)
+        if vid is None:
+            return None
+        return PlaylistItem(vid, opts, fps, width, temp, cache, workers, pool, opts['playlist_prefetch_mb'] << 20)
+
+    # next video isn't ready yet (skipped quickly, slow disk): say so, still take N and Q
+    def wait_ready(item):
+        shown = False
+        while not item.ready.wait(0.05):
+            if not shown:
+                session.out.add('\x1b[2J\x1b[H' + opts['buffering_message'] + '\n')
+                session.out.flush()
+                session.delta.invalidate()
+                shown = True
+            for key in session.keys.drain():
+                if key in ('q', 'Q'):
+                    return 'quit'
+                if key in ('n', 'N'):
+                    return 'next'
+        return 'ready'
+
+    session = PlayerSession(opts, playlist=True)
+    played = collections.deque(maxlen=100)
+    failed = 0
+    item = prefetch()
+    try:
+        while item is not None:
+            got = wait_ready(item)
+            if got != 'ready':
+                item.cancel()
+                item = None if got == 'quit' else prefetch()
+                continue
+            if item.error is not None:
+                played.append((item.vid, None, item.error))
+                failed += 1
+                item = None if failed >= len(videos) else prefetch()  # nothing on the list plays
+                continue
+            failed = 0
+            following = prefetch()  # starts getting ready now, while this one plays
+            _, audio, source, total, duration = item.stream
+            stats = play_ascii_video_stream_streaming(temp, audio, source, total, speed=fps, wide=width,
+                                                       buffer_size=item.buffer_size, video_duration=duration,
+                                                       seek_jump_seconds=opts['seek_jump_seconds'],
+                                                       fine_seek_seconds=opts['fine_seek_seconds'], options=opts,
+                                                       session=session, sound=item.sound)
+            played.append((item.vid, stats, None))
+            item = following
+            if stats['ended'] == 'quit':
+                break
+    finally:
+        if item is not None:
+            item.cancel()
+        session.close()
+        if pool is not None:
+            pool.terminate()
+    return list(played)
+
+def print_playlist_stats(played):
+    for vid, stats, error in played:
+        name = os.path.basename(vid)
+        if error is not None:
+            print(Fore.RED + f'{name}: nope, broke: {error}' + Style.RESET_ALL)
+        else:
+            print(Style.DIM + f"{name}: {stats['shown']} frames shown, {stats['dropped']} dropped, "
+                  f"{stats['late']} late" + Style.RESET_ALL)
+
+# vidminal.py --playlist [--loop] FILE_FOLDER_OR_LIST... : back to back, next one prefetched
+def playlist_cli(args, opts):
+    import argparse
+    parser = argparse.ArgumentParser(prog='vidminal.py --playlist',
+                                     description='Play videos back to back; the next one gets ready while one plays.')
+    parser.add_argument('paths', nargs='+', help='video files, folders and .m3u/.txt playlists')
+    parser.add_argument('--loop', action='store_true', default=opts['playlist_loop'],
+                        help='start over after the last one (kiosk mode)')
+    a = parser.parse_args(args)
+    videos = read_playlist(a.paths)
+    if not videos:
+        print('No videos found.')
+        return 1
+    try:
+        played = play_playlist(videos, OptionsWatcher('options.json'), a.loop)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        cleanup_temp_folder(opts['temp'])
+    print_playlist_stats(played)
+    return 0
+
+# a saved frame -> text to print. .vmf gets its escapes made here; old .txt frames still read as is
+def pic_from_ascii_txt(txt_path, depth='truecolor'):
+    if txt_path.endswith('.vmf'):
+        return AsciiFrame.load(txt_path).to_ansi(depth)
     with open(txt_path, 'r', encoding='utf-8') as f:
         return f.read()
 
@@ -573,10 +3681,11 @@ def main():
         box_line(f"  {Fore.GREEN}Space{reset}{text_color} = pause/play   {Fore.GREEN}Q{reset}{text_color} = quit"),
         box_line(f"  {Fore.GREEN}A/D{reset}{text_color} = seek 5s      {Fore.GREEN}←/→{reset}{text_color} = seek 1s"),
         box_line(f"  {Fore.GREEN}M{reset}{text_color} = mute           {Fore.GREEN}+/-{reset}{text_color} = volume"),
+        box_line(f"  {Fore.GREEN}I{reset}{text_color} = timing stats   {Fore.GREEN}N{reset}{text_color} = next (playlists)"),
         f"{box_color}╚{'═'* (box_width-2)}╝{reset}",
         ""
     ]
-    opts = load_options('options.json') # Load options again to ensure latest are used
+    opts = OptionsWatcher('options.json') # Load options again to ensure latest are used
     if opts['show_ui_on_start']:
         print("\n".join(lines))
 
@@ -619,43 +3728,36 @@ def main():
     temp = opts['temp']
     width = int(opts['wide'])
     fps = int(opts['fps'])
+    if os.path.isdir(vid) or vid.lower().endswith(PLAYLIST_EXTENSIONS):
+        videos = read_playlist([vid])
+        if not videos:
+            print(Fore.RED + f'No videos in "{vid}"' + reset)
+            return
+        try:
+            print_playlist_stats(play_playlist(videos, opts, opts['playlist_loop']))
+        finally:
+            cleanup_temp_folder(temp)
+        return
     atexit.unregister_all = getattr(atexit, 'unregister_all', lambda: None)  # For repeated runs in interactive mode
     atexit.unregister_all()
     atexit.register(lambda: cleanup_temp_folder(temp))
 
-    # --- Downscale to 144p if needed ---
-    # Ensure temp exists
-    if not os.path.exists(temp):
-        os.makedirs(temp)
-    # Check video resolution
-    try:
-        clip = VideoFileClip(vid)
-        w, h = clip.size
-        clip.close()
-        if h > 144:
-            # Downscale to 144p and use as new source
-            downscaled_path = os.path.join(temp, 'downscaled_144p.mp4')
-            # Use ffmpeg from env or system
-            ffmpeg_bin = os.environ.get('FFMPEG_BINARY', 'ffmpeg')
-            # -y to overwrite, -vf scale=-2:144 to keep aspect
-            cmd = [ffmpeg_bin, '-y', '-i', vid, '-vf', 'scale=-2:144', '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '28', '-c:a', 'copy', downscaled_path]
-            try:
-                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                vid = downscaled_path
-            except Exception as e:
-                print(Fore.RED + f"Downscaling failed: {e}" + reset)
-                sys.exit(1)
-        # else: use original vid
-    except Exception as e:
-        print(Fore.RED + f"Failed to check video resolution: {e}" + reset)
-        sys.exit(1)
-    # --- End downscale logic ---
-
+    cache = VideoCache.from_options(opts) if opts['cache_enabled'] else None
+    workers = opts['render_workers']
+    if workers < 0:
+        workers = min(4, (os.cpu_count() or 1) - 1)  # leave a core for decoding + playback
     try: # Pass new seek parameters to streaming function
-        frames, audio, frame_queue, total_frames, video_duration = get_stuff_from_video_stream(vid, temp, speed=fps, buffer_size=fps) # Note: get_stuff_from_video_stream doesn't need wide
+        print('Doing video things...')
+        frames, audio, frame_ring, total_frames, video_duration = get_stuff_from_video_stream(vid, temp, speed=fps, buffer_size=fps, wide=width,
+                                                                                              cache=cache, settings=opts.render,
+                                                                                              render_workers=workers, options=opts)
         print(Fore.GREEN + Style.BRIGHT + 'Streaming ASCII video...' + reset)
-        play_ascii_video_stream_streaming(frames, audio, frame_queue, total_frames, speed=fps, wide=width, buffer_size=fps, video_duration=video_duration,
-                                           seek_jump_seconds=opts['seek_jump_seconds'], fine_seek_seconds=opts['fine_seek_seconds'])
+        stats = play_ascii_video_stream_streaming(frames, audio, frame_ring, total_frames, speed=fps, wide=width, buffer_size=fps, video_duration=video_duration,
+                                                   seek_jump_seconds=opts['seek_jump_seconds'], fine_seek_seconds=opts['fine_seek_seconds'], options=opts)
+        print(Style.DIM + f"{stats['shown']} frames shown, {stats['dropped']} dropped, {stats['late']} late, "
+              f"A/V drift avg {stats['mean_abs_drift_ms']:.0f}ms max {stats['max_abs_drift_ms']:.0f}ms, "
+              f"terminal writes avg {stats['write_ms_mean']:.1f}ms max {stats['write_ms_max']:.0f}ms" +
+              (f", quality changed {stats['quality_changes']}x" if stats['quality_changes'] else '') + reset)
     except (KeyboardInterrupt, SystemExit):
         cleanup_temp_folder(temp)
         raise
@@ -665,7 +3767,52 @@ def main():
         sys.exit(1)
     cleanup_temp_folder(temp)
 
+# --startup-profile: what each import and the ffmpeg unpack cost, in the order they get paid
+def startup_profile():
+    import importlib
+    rows = [('core imports', STARTUP_IMPORTS, 'every launch (numpy, colorama, stdlib)')]
+    lazy = [('PIL.Image', 'first frame'), ('pygame', 'player start'), ('multiprocessing', 'render_workers > 0'),
+            ('py7zr', 'only when ffmpeg gets unpacked'), ('moviepy', 'old .txt path only')]
+    for name, when in lazy:
+        t0 = time.perf_counter()
+        try:
+            with SuppressStderr():
+                importlib.import_module(name)
+            note = f'lazy: {when}'
+        except ImportError:
+            note = 'not installed'
+        rows.append((name, time.perf_counter() - t0, note))
+    with managed_ffmpeg(rows):
+        pass
+    for label, secs, note in rows:
+        print(f'{label:<16} {secs * 1000:8.1f} ms  {note}')
+
 if __name__ == '__main__':
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()  # render workers in a frozen build
+    if len(sys.argv) > 1 and sys.argv[1] == '--startup-profile':
+        startup_profile()
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == '--bench-render':
+        bench_render(int(sys.argv[2]) if len(sys.argv) > 2 else 320)
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == '--cache':
+        sys.exit(cache_cli(sys.argv[2:], load_options('options.json')))
+    if len(sys.argv) > 1 and sys.argv[1] == '--export':
+        with managed_ffmpeg():
+            sys.exit(export_cli(sys.argv[2:], load_options('options.json')))
+    if len(sys.argv) > 1 and sys.argv[1] == '--convert':
+        with managed_ffmpeg():
+            sys.exit(batch_cli(sys.argv[2:], load_options('options.json')))
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        with managed_ffmpeg():
+            sys.exit(serve_cli(sys.argv[2:], load_options('options.json')))
+    if len(sys.argv) > 1 and sys.argv[1] == '--playlist':
+        with managed_ffmpeg():
+            sys.exit(playlist_cli(sys.argv[2:], load_options('options.json')))
+    if len(sys.argv) > 1 and sys.argv[1] == '--watch':
+        sys.exit(watch_cli(sys.argv[2:], load_options('options.json')))
     opts = load_options('options.json')
     temp = opts['temp']
     def handle_exit(*args):